@@ -0,0 +1,183 @@
+"""
+Banco di prova per la qualità dell'allineamento delle righe.
+
+Esegue tutte le strategie registrate in smart_compare.ALIGNMENT_STRATEGIES su
+coppie di documenti sintetici con corrispondenze note e riporta, per ogni
+strategia, precisione e richiamo dei match accanto a tempo e memoria di picco.
+
+Uso:
+    python alignment_benchmark.py --lines 2000 --seed 1
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Dict, List, Set, Tuple
+
+from smart_compare import ALIGNMENT_STRATEGIES, PDFComparator
+
+
+WORDS = (
+    "il la di che non un una per con come questo quella tempo mondo casa "
+    "cuore notte giorno mare cielo terra vento luce ombra amore vita morte "
+    "strada città fiume monte sole luna stella parola libro pagina voce "
+    "silenzio memoria sogno fuoco acqua pietra albero fiore campo porta "
+    "finestra mano occhi sguardo passo viaggio ritorno sera mattina"
+).split()
+
+# Scenari: probabilità per riga di cancellazione, modifica e inserimento
+SCENARIOS = {
+    'identico': (0.0, 0.0, 0.0),
+    'lievi_modifiche': (0.0, 0.15, 0.0),
+    'inserimenti_cancellazioni': (0.05, 0.05, 0.05),
+    'revisione_pesante': (0.10, 0.30, 0.10),
+}
+
+LINES_PER_PAGE = 40
+
+
+def _random_line(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(5, 12))]
+    words[0] = words[0].capitalize()
+    text = ' '.join(words)
+    # Circa una riga su quattro chiude un periodo
+    if rng.random() < 0.25:
+        text += '.'
+    return text
+
+
+def _modify_line(rng: random.Random, text: str) -> str:
+    """Introduce una piccola variazione: parola sostituita, refuso o punteggiatura"""
+    words = text.split()
+    kind = rng.random()
+    if kind < 0.5 and words:
+        k = rng.randrange(len(words))
+        words[k] = rng.choice(WORDS)
+    elif kind < 0.8 and words:
+        k = rng.randrange(len(words))
+        w = words[k]
+        if len(w) > 2:
+            p = rng.randrange(1, len(w) - 1)
+            words[k] = w[:p] + w[p + 1:]
+    else:
+        words.append(',')
+    return ' '.join(words)
+
+
+def _make_lines(texts: List[str], comparator: PDFComparator) -> List[Dict]:
+    lines = []
+    for i, text in enumerate(texts):
+        y = (i % LINES_PER_PAGE) * 14 + 50
+        lines.append({
+            'text': text,
+            'normalized': comparator.normalize_text(text),
+            'bbox': (50, y, 500, y + 12),
+            'page': i // LINES_PER_PAGE + 1
+        })
+    return lines
+
+
+def make_document_pair(n_lines: int, scenario: str, seed: int = 0,
+                       comparator: PDFComparator = None) -> Tuple[List[Dict], List[Dict], Set[Tuple[int, int]]]:
+    """
+    Genera una coppia di documenti sintetici
+
+    Returns:
+        (righe_doc1, righe_doc2, corrispondenze_vere) dove le corrispondenze sono
+        coppie (indice_doc1, indice_doc2)
+    """
+    comparator = comparator or PDFComparator()
+    rng = random.Random(seed)
+    p_del, p_mod, p_ins = SCENARIOS[scenario]
+
+    texts1 = [_random_line(rng) for _ in range(n_lines)]
+    texts2 = []
+    truth = set()
+
+    for i, text in enumerate(texts1):
+        r = rng.random()
+        if r < p_del:
+            continue
+        if r < p_del + p_mod:
+            text = _modify_line(rng, text)
+        truth.add((i, len(texts2)))
+        texts2.append(text)
+        if rng.random() < p_ins:
+            texts2.append(_random_line(rng))
+
+    return _make_lines(texts1, comparator), _make_lines(texts2, comparator), truth
+
+
+def evaluate_strategy(name: str, lines1: List[Dict], lines2: List[Dict],
+                      truth: Set[Tuple[int, int]], similarity_threshold: float = 0.7) -> Dict:
+    """Esegue una strategia e ne misura qualità, tempo e memoria di picco"""
+    strategy = ALIGNMENT_STRATEGIES[name]
+
+    comparator = PDFComparator(similarity_threshold)
+    start = time.perf_counter()
+    matches = strategy(comparator, lines1, lines2)
+    elapsed = time.perf_counter() - start
+
+    # Seconda esecuzione sotto tracemalloc, che rallenta: il tempo si misura nella prima
+    comparator = PDFComparator(similarity_threshold)
+    tracemalloc.start()
+    strategy(comparator, lines1, lines2)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    predicted = {(m['doc1'], m['doc2']) for m in matches}
+    correct = len(predicted & truth)
+    precision = correct / len(predicted) if predicted else 1.0
+    recall = correct / len(truth) if truth else 1.0
+
+    return {
+        'strategy': name,
+        'matches': len(predicted),
+        'precision': precision,
+        'recall': recall,
+        'seconds': elapsed,
+        'peak_mb': peak / (1024 * 1024)
+    }
+
+
+def run_benchmark(n_lines: int = 1000, seed: int = 0, scenarios: List[str] = None,
+                  strategies: List[str] = None) -> List[Dict]:
+    """Esegue tutte le strategie su tutti gli scenari richiesti"""
+    scenarios = scenarios or list(SCENARIOS)
+    strategies = strategies or list(ALIGNMENT_STRATEGIES)
+    results = []
+    for scenario in scenarios:
+        lines1, lines2, truth = make_document_pair(n_lines, scenario, seed)
+        for name in strategies:
+            row = evaluate_strategy(name, lines1, lines2, truth)
+            row['scenario'] = scenario
+            results.append(row)
+    return results
+
+
+def format_results(results: List[Dict]) -> str:
+    lines = [f"{'scenario':<28}{'strategia':<16}{'match':>8}{'precisione':>12}"
+             f"{'richiamo':>10}{'tempo (s)':>11}{'picco (MB)':>12}"]
+    for r in results:
+        lines.append(f"{r['scenario']:<28}{r['strategy']:<16}{r['matches']:>8}"
+                     f"{r['precision']:>12.3f}{r['recall']:>10.3f}"
+                     f"{r['seconds']:>11.3f}{r['peak_mb']:>12.2f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronta qualità e velocità delle strategie di allineamento")
+    parser.add_argument('--lines', type=int, default=1000, help="righe del documento sintetico")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="scenario da eseguire (ripetibile, default: tutti)")
+    parser.add_argument('--strategy', action='append', choices=list(ALIGNMENT_STRATEGIES),
+                        help="strategia da eseguire (ripetibile, default: tutte)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.lines, args.seed, args.scenario, args.strategy)
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterator, List, Tuple
+
+# Operazioni di SequenceMatcher diverse da 'equal', codificate come indici
+OPERATIONS = ('replace', 'delete', 'insert')
+
+# Caratteri che la normalizzazione trasforma in uno spazio semplice
+WHITESPACE_RE = re.compile(r'\s')
+
+
+def map_index(original: str, norm: str, index: int) -> int:
+    """
+    Posizione nel testo originale corrispondente alla posizione index del
+    testo normalizzato (minuscolo, senza punteggiatura, spazi compattati).
+    Qualunque spazio dell'originale (tab, spazio non separabile...) corrisponde
+    allo spazio del normalizzato; il risultato non supera len(original).
+    """
+    j = 0
+    for i in range(min(index, len(norm))):
+        c = norm[i]
+        while j < len(original):
+            ch = original[j]
+            if ch.lower() == c or (c == ' ' and WHITESPACE_RE.match(ch)):
+                break
+            j += 1
+        j += 1
+    return min(j, len(original))
+
+
+class DiffIndex:
+    """
+    Opcode delle differenze di tutte le righe del risultato, in array compatti
+    di interi: per ogni riga l'intervallo dei suoi opcode, per ogni opcode
+    l'operazione e le posizioni (i1, i2, j1, j2) nei testi normalizzati.
+    Costruito in un solo passaggio sul risultato, senza formattare nulla;
+    append aggiunge le righe di un risultato che arriva a blocchi.
+    """
+
+    def __init__(self, result: List[Dict] = ()):
+        self.offsets = array('i', [0])  # opcode della riga r: offsets[r]:offsets[r + 1]
+        self.operations = array('b')
+        self.positions = array('i')  # 4 interi per opcode
+        for r in result:
+            self.append(r)
+
+    def append(self, r: Dict):
+        """Aggiunge in fondo la riga r del risultato"""
+        for df in r['diff']:
+            self.operations.append(OPERATIONS.index(df['operation']))
+            self.positions.extend(df['position1'] + df['position2'])
+        self.offsets.append(len(self.operations))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def has_diff(self, row: int) -> bool:
+        return self.offsets[row + 1] > self.offsets[row]
+
+    def row_opcodes(self, row: int) -> Iterator[Tuple[str, int, int, int, int]]:
+        """Opcode della riga come (operazione, i1, i2, j1, j2)"""
+        positions = self.positions
+        for k in range(self.offsets[row], self.offsets[row + 1]):
+            p = 4 * k
+            yield (OPERATIONS[self.operations[k]],
+                   positions[p], positions[p + 1], positions[p + 2], positions[p + 3])
+
+
+class LineSpatialIndex:
+    """
+    Indice spaziale delle righe estratte, per pagina. I bordi y0/y1 delle righe
+    dividono la pagina in fasce orizzontali (i bordi stessi e gli intervalli
+    aperti tra due bordi); per ogni fascia si tengono le righe che la
+    contengono ordinate per x0, con il massimo progressivo di x1.
+    Una ricerca è quindi una bisezione sulla y e una sulla x, anche con righe
+    alte o sovrapposte. La x distingue le righe affiancate (testo su più colonne).
+    """
+
+    def __init__(self, lines: List[Dict]):
+        pages = {}
+        for i, line in enumerate(lines):
+            x0, y0, x1, y1 = line['bbox'][:4]
+            pages.setdefault(line['page'], []).append((x0, y0, x1, y1, i))
+
+        self.pages = {}  # pagina (base 1) -> (bordi delle fasce, fasce)
+        for page, entries in pages.items():
+            bounds = sorted({e[1] for e in entries} | {e[3] for e in entries})
+            # Fascia 2k: il bordo k; fascia 2k + 1: tra il bordo k e il successivo
+            bands = [[] for _ in range(2 * len(bounds))]
+            for entry in entries:
+                first = 2 * bisect_left(bounds, entry[1])
+                last = 2 * bisect_left(bounds, entry[3])
+                for band in range(first, last + 1):
+                    bands[band].append(entry)
+            self.pages[page] = (array('d', bounds), [self._band(band) for band in bands])
+
+    @staticmethod
+    def _band(entries):
+        """
+        Fascia pronta per la bisezione sulla x: x0 ordinati, righe e, per ogni
+        posizione, la riga che arriva più a destra tra quelle che la precedono
+        """
+        entries.sort()
+        reach = []
+        best = None
+        for entry in entries:
+            if best is None or (entry[2], -entry[4]) > (best[2], -best[4]):
+                best = entry
+            reach.append(best)
+        return array('d', (e[0] for e in entries)), entries, reach
+
+    def find(self, page: int, x: float, y: float) -> int:
+        """
+        Indice della riga sotto il punto (x, y) della pagina (base 1), o -1.
+        Se nessuna riga contiene anche la x si sceglie, tra quelle che
+        contengono la y, la più vicina in orizzontale (tra righe sovrapposte
+        alla stessa distanza ne viene restituita una).
+        """
+        entry = self.pages.get(page)
+        if entry is None:
+            return -1
+        bounds, bands = entry
+
+        k = bisect_right(bounds, y) - 1
+        if k < 0:
+            return -1
+        band = 2 * k if bounds[k] == y else 2 * k + 1
+
+        best = -1
+        best_distance = None
+        for x0, y0, x1, y1, i in self._nearest(bands[band], x):
+            distance = 0 if x0 <= x <= x1 else min(abs(x - x0), abs(x - x1))
+            if best_distance is None or (distance, i) < (best_distance, best):
+                best, best_distance = i, distance
+        return best
+
+    @staticmethod
+    def _nearest(band, x):
+        """Righe della fascia più vicine alla x: quella che arriva più a destra tra le precedenti e la successiva"""
+        x0s, entries, reach = band
+        j = bisect_right(x0s, x)
+        candidates = []
+        if j > 0:
+            candidates.append(reach[j - 1])
+        if j < len(entries):
+            candidates.append(entries[j])
+        return candidates
+
+
+class AlignmentIndex:
+    """
+    Corrispondenze tra le righe del documento 1, quelle del documento 2 e le
+    righe del risultato, in array di interi (-1 = nessuna corrispondenza).
+    I pannelli mostrano tutte le righe del proprio documento, quindi la riga
+    di un pannello coincide con l'indice della riga nel documento: le righe
+    aggiunte o tolte restano visibili come righe senza corrispondenza.
+    Un risultato che arriva a blocchi si aggiunge con append: tutte le
+    interrogazioni, scroll compreso, vedono subito i match già registrati.
+    """
+
+    def __init__(self, result: List[Dict], n_lines1: int, n_lines2: int):
+        self.result1 = array('i', [-1]) * n_lines1  # riga doc1 -> indice nel risultato
+        self.result2 = array('i', [-1]) * n_lines2  # riga doc2 -> indice nel risultato
+        self.other1 = array('i', [-1]) * n_lines1  # riga doc1 -> riga doc2 corrispondente
+        self.other2 = array('i', [-1]) * n_lines2  # riga doc2 -> riga doc1 corrispondente
+        self.matched1 = array('i')  # righe abbinate del doc1, ordinate
+        self.matched2 = array('i')  # righe abbinate del doc2, ordinate
+
+        for k, r in enumerate(result):
+            self.append(k, r)
+
+    def append(self, k: int, r: Dict):
+        """Registra la riga k del risultato"""
+        i, j = r['doc1'], r['doc2']
+        if self.result1[i] < 0:
+            # I match arrivano in ordine di doc1: di solito è un'aggiunta in fondo
+            insort(self.matched1, i)
+        self.result1[i] = k
+        self.other1[i] = j
+        # Una riga del doc2 abbinata più volte resta legata al primo abbinamento
+        if self.result2[j] < 0:
+            insort(self.matched2, j)
+            self.result2[j] = k
+            self.other2[j] = i
+
+    def result_row(self, side: int, line: int) -> int:
+        """Indice nel risultato della riga line del documento side (0 o 1), o -1"""
+        rows = self.result1 if side == 0 else self.result2
+        return rows[line] if 0 <= line < len(rows) else -1
+
+    def counterpart(self, side: int, line: int) -> int:
+        """Riga dell'altro documento abbinata alla riga line del documento side, o -1"""
+        other = self.other1 if side == 0 else self.other2
+        return other[line] if 0 <= line < len(other) else -1
+
+    def scroll_row(self, side: int, line: int) -> int:
+        """
+        Riga dell'altro pannello da mostrare in cima quando line è in cima al
+        pannello side: le righe senza corrispondenza seguono l'ultima riga
+        abbinata che le precede (bisezione sulle righe abbinate)
+        """
+        other = self.other1 if side == 0 else self.other2
+        if not 0 <= line < len(other):
+            return -1
+        if other[line] >= 0:
+            return other[line]
+        matched = self.matched1 if side == 0 else self.matched2
+        k = bisect_right(matched, line) - 1
+        return other[matched[k]] if k >= 0 else 0
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from smart_compare import ComparisonCancelled, iter_matches
+
+# Intervallo della percentuale complessiva occupato da ogni stadio del confronto
+STAGE_RANGES = {
+    'estrazione1': (0, 15),
+    'estrazione2': (15, 30),
+    'confronto': (30, 100),
+}
+
+# Ogni quanti secondi i match trovati vengono consegnati alla GUI
+MATCH_BATCH_SECONDS = 0.1
+
+STAGE_LABELS = {
+    'estrazione1': "Estrazione del testo dal PDF 1",
+    'estrazione2': "Estrazione del testo dal PDF 2",
+    'confronto': "Confronto delle righe",
+}
+
+
+class ComparisonWorker(QThread):
+    """
+    Esegue il confronto (iter_matches) in un thread separato, così la finestra
+    resta reattiva. Segnala l'avanzamento per stadio, consegna il testo estratto
+    appena disponibile e i match a blocchi man mano che vengono trovati, senza
+    tenerne una copia: la lista completa esiste solo dalla parte della GUI.
+    Può essere annullato: l'annullamento è cooperativo, il confronto si ferma
+    al primo controllo successivo alla richiesta.
+    """
+    progress_updated = pyqtSignal(int)  # percentuale complessiva
+    stage_changed = pyqtSignal(str)  # descrizione dello stadio corrente
+    lines_extracted = pyqtSignal(object, object)  # righe del doc1 e del doc2
+    matches_found = pyqtSignal(object)  # blocco di nuovi match, in ordine di riga del doc1
+    comparison_complete = pyqtSignal()
+    comparison_cancelled = pyqtSignal()
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, pdf1, pdf2, mode='lines', parent=None):
+        super().__init__(parent)
+        self.pdf1 = pdf1
+        self.pdf2 = pdf2
+        self.mode = mode
+        self.cancel_event = threading.Event()
+        self.stage = None
+        self.percent = -1
+
+    def cancel(self):
+        """Chiede l'interruzione del confronto"""
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def report(self, stage, done, total):
+        # Chiamata dal thread del confronto: i segnali arrivano alla GUI in coda
+        if stage != self.stage:
+            self.stage = stage
+            self.stage_changed.emit(STAGE_LABELS.get(stage, stage))
+        start, end = STAGE_RANGES.get(stage, (0, 100))
+        percent = start + (end - start) * done // total if total else end
+        if percent != self.percent:
+            self.percent = percent
+            self.progress_updated.emit(percent)
+
+    def run(self):
+        batch = []
+        last_emit = time.monotonic()
+        try:
+            for match in iter_matches(self.pdf1, self.pdf2, mode=self.mode,
+                                      progress=self.report,
+                                      cancel_event=self.cancel_event,
+                                      on_lines=self.lines_extracted.emit):
+                batch.append(match)
+                now = time.monotonic()
+                if now - last_emit >= MATCH_BATCH_SECONDS:
+                    self.matches_found.emit(batch)
+                    batch = []
+                    last_emit = now
+        except ComparisonCancelled:
+            self.comparison_cancelled.emit()
+            return
+        except Exception as e:
+            logging.error(f"Errore nel confronto di {self.pdf1} e {self.pdf2}: {e}")
+            self.error_occurred.emit(str(e))
+            return
+        if batch:
+            self.matches_found.emit(batch)
+        self.comparison_complete.emit()
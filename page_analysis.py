@@ -0,0 +1,230 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import fitz  # PyMuPDF
+
+# Flag per l'estrazione del testo: come "dict" ma senza i dati delle immagini
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Numero massimo di documenti analizzati tenuti in memoria
+MAX_CACHED_DOCUMENTS = 4
+
+# Memoria (stimata) per le analisi delle pagine di ogni documento in cache:
+# TextPage e dizionari restano disponibili per tutti gli estrattori e per le
+# ricerche, e si liberano le pagine usate meno di recente solo oltre il budget
+ANALYSIS_BUDGET_MB = 64
+
+# Stima dell'occupazione di una pagina analizzata: TextPage (per carattere)
+# più gli oggetti Python del dizionario (per span e per carattere)
+SPAN_BYTES = 1500
+CHAR_BYTES = 150
+# Stima per una pagina con il solo TextPage (ricerca senza dizionario)
+TEXTPAGE_BYTES = 256 * 1024
+
+
+class PageAnalysis:
+    """
+    Analisi di una singola pagina: il TextPage e il dizionario del testo sono
+    calcolati una sola volta e condivisi da tutti gli estrattori, dalle
+    ricerche e dalle evidenziazioni, finché il documento li tiene nel budget.
+    PyMuPDF non ammette l'uso contemporaneo di un documento da più thread:
+    ogni accesso alla pagina avviene sotto il lock del documento.
+    """
+
+    def __init__(self, document, number: int):
+        self.document = document
+        self.number = number
+        self.lock = document._lock
+        self.size = 0  # byte stimati, contati nel budget del documento
+        self._page = None
+        self._textpage = None
+        self._text_dict = None
+
+    @property
+    def page(self):
+        with self.lock:
+            if self._page is None:
+                self._page = self.document.doc[self.number]
+            return self._page
+
+    @property
+    def textpage(self):
+        with self.lock:
+            if self._textpage is None:
+                self._textpage = self.page.get_textpage(flags=TEXT_FLAGS)
+                self.document._account(self)
+            return self._textpage
+
+    @property
+    def text_dict(self) -> Dict:
+        """Equivalente di page.get_text("dict"), da non modificare"""
+        with self.lock:
+            if self._text_dict is None:
+                if self._textpage is None:
+                    self._textpage = self.page.get_textpage(flags=TEXT_FLAGS)
+                self._text_dict = self.page.get_text("dict", textpage=self._textpage)
+                self.document._account(self)
+            return self._text_dict
+
+    def text_blocks(self) -> List[Dict]:
+        """Blocchi di testo (type 0) della pagina"""
+        return [block for block in self.text_dict["blocks"] if block.get("type") == 0]
+
+    def lines(self) -> Iterator[Dict]:
+        """Righe di tutti i blocchi di testo, nell'ordine di estrazione"""
+        for block in self.text_blocks():
+            yield from block["lines"]
+
+    def spans(self) -> Iterator[Dict]:
+        """Span di tutte le righe, nell'ordine di estrazione"""
+        for line in self.lines():
+            yield from line["spans"]
+
+    def search(self, needle: str, clip=None, quads: bool = False) -> List:
+        """Cerca un testo nella pagina (o nell'area clip) riusando il TextPage già calcolato"""
+        with self.lock:
+            return self.page.search_for(needle, clip=clip, textpage=self.textpage, quads=quads)
+
+    def estimate_size(self) -> int:
+        if self._text_dict is None:
+            return TEXTPAGE_BYTES if self._textpage is not None else 0
+        spans = chars = 0
+        for block in self._text_dict["blocks"]:
+            for line in block.get("lines", ()):
+                for span in line["spans"]:
+                    spans += 1
+                    chars += len(span["text"])
+        return spans * SPAN_BYTES + chars * CHAR_BYTES
+
+    def release(self):
+        """Libera pagina, TextPage e dizionario (verranno ricalcolati se richiesti)"""
+        with self.lock:
+            self._page = None
+            self._textpage = None
+            self._text_dict = None
+            self.size = 0
+
+
+class DocumentAnalysis:
+    """
+    Documento PDF aperto una volta, con l'analisi delle pagine in cache entro
+    budget_bytes: oltre il budget si liberano le pagine usate meno di recente.
+    users conta chi lo sta usando (vedi use_document): un documento uscito
+    dalla cache viene chiuso solo quando l'ultimo utilizzatore lo rilascia.
+    """
+
+    def __init__(self, pdf_path: str, budget_mb: float = ANALYSIS_BUDGET_MB):
+        self.path = pdf_path
+        self.doc = fitz.open(pdf_path)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.used_bytes = 0
+        self._pages = OrderedDict()  # pagina -> PageAnalysis, dalla meno usata di recente
+        self._lock = threading.RLock()  # serializza ogni accesso al documento
+        self.users = 0  # protetto da _documents_lock
+        self.evicted = False  # uscito dalla cache: va chiuso appena inutilizzato
+
+    def __len__(self):
+        with self._lock:
+            return self.doc.page_count
+
+    def page(self, page_num: int) -> PageAnalysis:
+        """Analisi della pagina page_num (0-based)"""
+        with self._lock:
+            analysis = self._pages.get(page_num)
+            if analysis is None:
+                analysis = PageAnalysis(self, page_num)
+                self._pages[page_num] = analysis
+            else:
+                self._pages.move_to_end(page_num)
+            return analysis
+
+    def pages(self) -> Iterator[PageAnalysis]:
+        for page_num in range(len(self)):
+            yield self.page(page_num)
+
+    def _account(self, analysis: PageAnalysis):
+        # Chiamata con il lock acquisito, dopo che la pagina ha calcolato qualcosa
+        size = analysis.estimate_size()
+        self.used_bytes += size - analysis.size
+        analysis.size = size
+        self._pages[analysis.number] = analysis
+        self._pages.move_to_end(analysis.number)
+        while self.used_bytes > self.budget_bytes and len(self._pages) > 1:
+            _, old = self._pages.popitem(last=False)
+            self.used_bytes -= old.size
+            old.release()
+
+    def close(self):
+        with self._lock:
+            for analysis in self._pages.values():
+                analysis.release()
+            self._pages.clear()
+            self.used_bytes = 0
+            if not self.doc.is_closed:
+                self.doc.close()
+
+
+_documents = OrderedDict()  # (percorso, mtime, dimensione) -> DocumentAnalysis
+_documents_lock = threading.Lock()
+
+
+def _document_key(pdf_path: str):
+    path = os.path.abspath(pdf_path)
+    st = os.stat(path)
+    return path, st.st_mtime_ns, st.st_size
+
+
+def _close_when_unused(analysis: DocumentAnalysis):
+    # Chiamata con _documents_lock acquisito
+    if analysis.users == 0:
+        analysis.close()
+    else:
+        analysis.evicted = True
+
+
+def _acquire_document(pdf_path: str) -> DocumentAnalysis:
+    key = _document_key(pdf_path)
+    with _documents_lock:
+        analysis = _documents.get(key)
+        if analysis is not None:
+            _documents.move_to_end(key)
+        else:
+            analysis = DocumentAnalysis(pdf_path)
+            _documents[key] = analysis
+            while len(_documents) > MAX_CACHED_DOCUMENTS:
+                _, old = _documents.popitem(last=False)
+                _close_when_unused(old)
+        analysis.users += 1
+        return analysis
+
+
+def _release_document_use(analysis: DocumentAnalysis):
+    with _documents_lock:
+        analysis.users -= 1
+        if analysis.evicted and analysis.users == 0:
+            analysis.close()
+
+
+@contextmanager
+def use_document(pdf_path: str) -> Iterator[DocumentAnalysis]:
+    """
+    Analisi condivisa del documento, aperto solo la prima volta, per la durata
+    del blocco with. Il documento non va chiuso dal chiamante: lo gestisce la
+    cache, che non lo chiude finché qualcuno lo sta usando.
+    """
+    analysis = _acquire_document(pdf_path)
+    try:
+        yield analysis
+    finally:
+        _release_document_use(analysis)
+
+
+def release_document(pdf_path: str):
+    """Rimuove dalla cache tutte le versioni di un documento, chiudendole appena inutilizzate"""
+    path = os.path.abspath(pdf_path)
+    with _documents_lock:
+        for key in [k for k in _documents if k[0] == path]:
+            _close_when_unused(_documents.pop(key))
@@ -0,0 +1,278 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+
+# Budget di memoria predefinito per la cache delle pagine renderizzate
+DEFAULT_CACHE_BUDGET_MB = 256
+
+# Documenti aperti al massimo da ogni thread di rendering
+MAX_THREAD_DOCUMENTS = 4
+
+# Lato dei tasselli (in pixel logici) usati per il rendering ad alto zoom
+TILE_SIZE = 512
+
+
+def pixmap_to_qimage(pix) -> QImage:
+    """
+    Avvolge i campioni di un fitz.Pixmap in una QImage senza passare da un
+    formato intermedio (PPM/PNG) e senza copiare i dati.
+
+    La QImage fa riferimento alla memoria del Pixmap, che resta legato
+    all'immagine finché questa è in uso.
+    """
+    if pix.n - pix.alpha != 3:
+        # Scala di grigi o CMYK: converti in RGB
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+
+    fmt = QImage.Format.Format_RGBA8888 if pix.alpha else QImage.Format.Format_RGB888
+    samples = pix.samples_ptr if hasattr(pix, 'samples_ptr') else pix.samples
+    image = QImage(samples, pix.width, pix.height, pix.stride, fmt)
+    image._pix = pix  # mantiene vivi i dati referenziati dalla QImage
+    return image
+
+
+def render_page_image(page, zoom: float = 1.0, clip=None) -> QImage:
+    """Renderizza una pagina (o l'area clip, in coordinate pagina) in una QImage"""
+    mat = fitz.Matrix(zoom, zoom)
+    pix = page.get_pixmap(matrix=mat, clip=clip, alpha=False)
+    return pixmap_to_qimage(pix)
+
+
+class PageRenderCache:
+    """
+    Cache LRU delle pagine renderizzate, con un budget di memoria in MB.
+
+    Le chiavi sono tuple che iniziano con la chiave del documento, tipicamente
+    (documento, pagina, zoom, device_pixel_ratio).
+    """
+
+    def __init__(self, budget_mb: float = DEFAULT_CACHE_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, key):
+        return key in self._images
+
+    def get(self, key):
+        """Restituisce l'immagine in cache (aggiornandone l'uso) o None"""
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image: QImage):
+        """Inserisce un'immagine, eliminando le meno usate se si supera il budget"""
+        size = image.sizeInBytes()
+        if size > self.budget_bytes:
+            return
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old.sizeInBytes()
+            self._images[key] = image
+            self.used_bytes += size
+            self._evict()
+
+    def set_budget(self, budget_mb: float):
+        with self._lock:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+            self._evict()
+
+    def _evict(self):
+        while self.used_bytes > self.budget_bytes and self._images:
+            _, image = self._images.popitem(last=False)
+            self.used_bytes -= image.sizeInBytes()
+
+    def discard_document(self, doc_key):
+        """Rimuove tutte le immagini di un documento"""
+        with self._lock:
+            for key in [k for k in self._images if k[0] == doc_key]:
+                self.used_bytes -= self._images.pop(key).sizeInBytes()
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.used_bytes = 0
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return (f"cache pagine: {len(self._images)} immagini, "
+                f"{self.used_bytes / (1024 * 1024):.1f}/{self.budget_bytes / (1024 * 1024):.0f} MB, "
+                f"hit {self.hits} miss {self.misses} ({ratio:.0f}%)")
+
+
+def document_key(path: str):
+    """Identifica una versione del file senza leggerlo: (percorso, mtime, dimensione)"""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+
+class _ThreadDocuments:
+    """Documenti aperti da un thread di rendering, chiudibili anche da altri thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.docs = OrderedDict()  # document_key -> fitz.Document
+        self.in_use = None  # chiave del documento in uso dal thread proprietario
+        self.discarded = set()  # chiavi da chiudere appena finito l'uso
+
+
+_thread_state = threading.local()
+_all_thread_documents = weakref.WeakSet()
+_all_thread_documents_lock = threading.Lock()
+
+
+@contextmanager
+def thread_document(path: str):
+    """
+    Documento aperto dal thread corrente: un fitz.Document non va usato da più
+    thread, quindi ogni thread di rendering apre la propria copia. La chiave
+    comprende mtime e dimensione, così un file modificato viene riaperto.
+    """
+    state = getattr(_thread_state, 'docs', None)
+    if state is None:
+        state = _thread_state.docs = _ThreadDocuments()
+        with _all_thread_documents_lock:
+            _all_thread_documents.add(state)
+
+    key = document_key(path)
+    with state.lock:
+        doc = state.docs.get(key)
+        if doc is None:
+            doc = fitz.open(path)
+            state.docs[key] = doc
+            while len(state.docs) > MAX_THREAD_DOCUMENTS:
+                state.docs.popitem(last=False)[1].close()
+        else:
+            state.docs.move_to_end(key)
+        state.in_use = key
+    try:
+        yield doc
+    finally:
+        with state.lock:
+            state.in_use = None
+            if key in state.discarded:
+                state.discarded.discard(key)
+                state.docs.pop(key).close()
+
+
+def release_thread_documents(path: str):
+    """
+    Chiude le copie di un documento (tutte le versioni) aperte dai thread di
+    rendering; quelle in uso vengono chiuse dal thread stesso a fine rendering
+    """
+    path = os.path.abspath(path)
+    with _all_thread_documents_lock:
+        states = list(_all_thread_documents)
+    for state in states:
+        with state.lock:
+            for key in [k for k in state.docs if k[0] == path]:
+                if key == state.in_use:
+                    state.discarded.add(key)
+                else:
+                    state.docs.pop(key).close()
+
+
+class PageRenderJob(QRunnable):
+    """Rendering di una pagina (o di una sua area) su un thread di lavoro"""
+
+    def __init__(self, renderer, key, path, page_num, zoom, dpr=1.0, clip=None):
+        super().__init__()
+        self.setAutoDelete(False)  # il riferimento è tenuto dal renderer
+        self.renderer = renderer
+        self.key = key
+        self.path = path
+        self.page_num = page_num
+        self.zoom = zoom
+        self.dpr = dpr
+        self.clip = clip
+
+    def run(self):
+        try:
+            with thread_document(self.path) as doc:
+                image = render_page_image(doc[self.page_num], self.zoom * self.dpr, clip=self.clip)
+            image.setDevicePixelRatio(self.dpr)
+        except Exception as e:
+            print(f"Errore nel rendering della pagina {self.page_num}: {e}")
+            image = None
+        self.renderer.job_finished.emit(self.key, image)
+
+
+class BackgroundRenderer(QObject):
+    """
+    Renderizza pagine su un pool di thread e inserisce le immagini nella cache.
+    I lavori non ancora iniziati possono essere annullati; quelli già in corso
+    terminano e il loro risultato resta comunque in cache.
+    """
+    job_finished = pyqtSignal(object, object)   # uso interno: chiave, QImage o None
+    page_rendered = pyqtSignal(object, object)  # chiave, QImage
+
+    def __init__(self, cache: PageRenderCache, max_threads: int = 1, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._pending = {}  # chiave -> PageRenderJob
+        self.job_finished.connect(self._on_job_finished)
+
+    def is_pending(self, key) -> bool:
+        return key in self._pending
+
+    def request(self, key, path, page_num, zoom, dpr=1.0, clip=None, priority=0) -> bool:
+        """
+        Accoda il rendering se l'immagine non è già in cache o in lavorazione.
+        A priorità più alta corrisponde un'esecuzione anticipata.
+        """
+        if key in self.cache or key in self._pending:
+            return False
+        job = self.make_job(key, path, page_num, zoom, dpr, clip)
+        self._pending[key] = job
+        self.pool.start(job, priority)
+        return True
+
+    def make_job(self, key, path, page_num, zoom, dpr, clip) -> QRunnable:
+        """Crea il lavoro di rendering (ridefinibile dalle sottoclassi)"""
+        return PageRenderJob(self, key, path, page_num, zoom, dpr, clip)
+
+    def cancel(self, key) -> bool:
+        """Annulla un lavoro non ancora iniziato"""
+        job = self._pending.get(key)
+        if job is not None and self.pool.tryTake(job):
+            del self._pending[key]
+            return True
+        return False
+
+    def cancel_where(self, predicate):
+        """Annulla i lavori non ancora iniziati la cui chiave soddisfa predicate"""
+        for key in list(self._pending):
+            if predicate(key):
+                self.cancel(key)
+
+    def cancel_pending(self, keep=()):
+        """Annulla tutti i lavori non ancora iniziati, tranne quelli in keep"""
+        self.cancel_where(lambda key: key not in keep)
+
+    def _on_job_finished(self, key, image):
+        self._pending.pop(key, None)
+        if image is None:
+            return
+        self.cache.put(key, image)
+        self.page_rendered.emit(key, image)
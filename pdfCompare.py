@@ -4,22 +4,42 @@ import os
 import logging
 from typing import List
 import difflib
+from collections import deque
 import fitz
-from smart_compare import compare_pdf_files
+from compare_worker import ComparisonWorker
+from compare_index import AlignmentIndex, DiffIndex, LineSpatialIndex, map_index
+from pipeline_profiler import profiler
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QTextEdit, QFileDialog,
     QGroupBox, QSplitter,
-    QMessageBox, QProgressBar, QStackedWidget
+    QMessageBox, QProgressBar, QStackedWidget, QInputDialog
 )
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 from PyQt6.QtGui import (QFont, QColor,
                          QTextCursor, QMouseEvent)
 
 from config import ConfigWidget
 
 from pdf_txt_viewer import PdfTxtViewer
+from pdf_viewer import SyncedPageLoader
+from txt_viewer import txt_colors, ScrollSync
+
+# Prefisso 'score x.xx  ' delle righe del primo pannello
+SCORE_PREFIX_LENGTH = 12
+UNMATCHED_PREFIX = 'score  --   '  # righe senza corrispondenza, stessa lunghezza
+
+# Le righe del confronto vengono aggiunte ai pannelli a blocchi, con un timer
+STREAM_INTERVAL_MS = 50
+STREAM_MATCHES_PER_TICK = 500
+
+# Colori delle differenze nella modalità "evidenzia tutte le differenze"
+DIFF_COLORS = {
+    'replace': txt_colors[0],
+    'delete': txt_colors[1],
+    'insert': txt_colors[2],
+}
 
 
 def doc_page_count(path_file: str) -> int:
@@ -47,18 +67,6 @@ def doc_page_count(path_file: str) -> int:
         print(f"Si è verificato un errore: {e}")
         return -1
 
-def map_index(original, norm, index):
-
-    j = 0
-    for i in range(len(norm)):
-        if i >= index:
-            break
-        while norm[i] != original[j].lower() and j < len(original):
-            j += 1
-        j += 1
-    return j
-
-
 
 class txt_converter(QWidget):
     def __init__(self):
@@ -111,14 +119,11 @@ class txt_converter(QWidget):
             self.text_extraction.highlight_pdf(current_page, test_bbox, test_color)
             #self.diff_viewer.pdf_viewer1.highlight_text_line(current_page, test_bbox, test_color)
         elif ev == '2':
-            # click sul pdf
-            if self.pages_block:
-                page = a3 + 1
-                for i, l in enumerate(self.pages_block):
-                    if l['page'] == page:
-                        if l['bbox'][1] <= a2 and l['bbox'][3] >= a2:
-                            self.text_extraction.highlight_txt(i + 1)
-                            #self.diff_viewer.left_text.highlight_and_scroll_to_line(i+1)
+            # click sul pdf: a1 = x, a2 = y, a3 = pagina (0-based)
+            i = self.line_index.find(a3 + 1, a1, a2)
+            if i >= 0:
+                self.text_extraction.highlight_txt(i + 1)
+                #self.diff_viewer.left_text.highlight_and_scroll_to_line(i+1)
 
         a = 0
     def extract_text(self, pdf_path):
@@ -129,20 +134,36 @@ class txt_converter(QWidget):
         from pdf_processor import extract_text_lines_from_pdf, remove_notes
         blocks = extract_text_lines_from_pdf(pdf_path)
         self.pages_block = remove_notes(blocks)
+        self.line_index = LineSpatialIndex(self.pages_block)
 
         pages_text = [t['text'].replace('\n', ' ') for t in self.pages_block]
-        for t in pages_text:
-            self.text_extraction.print_txt(t)
+        self.text_extraction.set_lines(pages_text)
 
 class pdf_compare(QWidget):
     statusUpdate = pyqtSignal(str)
+    progressUpdate = pyqtSignal(int)
+    comparisonRunning = pyqtSignal(bool)
 
     def __init__(self):
         super().__init__()
 
+        self.compare_mode = 'lines' # strategia di allineamento (vedi smart_compare.ALIGNMENT_STRATEGIES)
         self.result = None # risultato della comparazione
         self.txt1 = None # righe estratte dal documento 1
         self.txt2 = None # righe estratte dal documento 2
+        self.page_loader = SyncedPageLoader(self) # navigazione contemporanea dei due pdf
+        self.diff_index = None # opcode delle differenze per riga del risultato
+        self.show_all_diffs = True # colora le differenze di tutte le righe visibili
+        self.line_indexes = (None, None) # indici spaziali delle righe dei due documenti
+        self.alignment = None # corrispondenze tra righe del doc1, del doc2 e del risultato
+        self.worker = None # confronto in corso in background
+        self.cancelled_workers = set() # confronti annullati non ancora terminati
+        self.pending_matches = deque() # match ricevuti e non ancora aggiunti ai pannelli
+        self.shown_rows = [0, 0] # righe già aggiunte ai due pannelli
+        self.stream_finished = False # il worker ha consegnato tutti i match
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(STREAM_INTERVAL_MS)
+        self.stream_timer.timeout.connect(self.append_pending_rows)
 
         main_layout = QVBoxLayout(self)
 
@@ -203,14 +224,10 @@ class pdf_compare(QWidget):
     def setup_scroll_sync(self):
         """Configura la sincronizzazione dello scroll"""
 
-        left_scroll = self.file1.text_viewer.verticalScrollBar()
-        right_scroll = self.file2.text_viewer.verticalScrollBar()
-
-        self.left_scroll_connection = left_scroll.valueChanged.connect(
-            lambda v: right_scroll.setValue(v)) # if self.sync_scroll_cb.isChecked() else None
-
-        self.right_scroll_connection = right_scroll.valueChanged.connect(
-            lambda v: left_scroll.setValue(v)) # if self.sync_scroll_cb.isChecked() else None
+        # Lo scroll segue la mappatura delle righe dell'allineamento, non il valore
+        # grezzo della scrollbar: finché i pannelli mostrano le righe del risultato
+        # (una per coppia allineata) la mappatura è l'identità
+        self.scroll_sync = ScrollSync(self.file1.text_viewer, self.file2.text_viewer, self)
 
 
     def compare_files(self, pdf1, pdf2):
@@ -221,30 +238,215 @@ class pdf_compare(QWidget):
             QMessageBox.warning(self, "⚠️ Errore", f"Errore nell'apertura dei file PDF:\n{str(e)}")
             return
 
-        # Disabilita il pulsante e mostra la progress bar
-        '''
-        self.compare_button.setEnabled(False)
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        self.statusBar().showMessage("🔄 Confronto in corso...")
-
-        self.tab_widget.setCurrentIndex(1)
-        '''
-        self.result, self.txt1, self.txt2 = compare_pdf_files(pdf1, pdf2)
-        for r in self.result:
-            t1 = self.txt1[r['doc1']]['text']
-            t2 = self.txt2[r['doc2']]['text']
-            score = r['score']
-            self.file1.print_txt(f'score {score:.2f}  {t1}')
-            self.file2.print_txt(f'{t2} ')
-
-    def pdf_to_txt(self, pag, y, pages_block):
-        page = pag + 1
-        for i, l in enumerate(pages_block):
-            if l['page'] == page:
-                if l['bbox'][1] <= y and l['bbox'][3] >= y:
-                    return i + 1
-        return -1
+        # Un confronto ancora in corso viene annullato: i suoi segnali successivi
+        # vengono ignorati perché non provengono più da self.worker
+        self.cancel_comparison()
+        self.clear_comparison()
+
+        profiler.reset()
+        worker = ComparisonWorker(pdf1, pdf2, self.compare_mode, self)
+        worker.progress_updated.connect(self.progressUpdate)
+        worker.stage_changed.connect(self.on_comparison_stage)
+        worker.lines_extracted.connect(self.on_lines_extracted)
+        worker.matches_found.connect(self.on_matches_found)
+        worker.comparison_complete.connect(self.on_comparison_complete)
+        worker.comparison_cancelled.connect(self.on_comparison_cancelled)
+        worker.error_occurred.connect(self.on_comparison_error)
+        worker.finished.connect(worker.deleteLater)
+        self.worker = worker
+        self.progressUpdate.emit(0)
+        self.comparisonRunning.emit(True)
+        worker.start()
+
+    def cancel_comparison(self):
+        """Annulla il confronto in corso, se c'è"""
+        if self.worker is not None:
+            worker = self.worker
+            worker.cancel()
+            # Il thread può lavorare ancora un po': il riferimento resta finché non termina
+            self.cancelled_workers.add(worker)
+            worker.finished.connect(lambda: self.cancelled_workers.discard(worker))
+            self.worker = None
+            self.comparisonRunning.emit(False)
+
+    def stop_comparisons(self):
+        """Annulla il confronto in corso e attende la fine di tutti i thread di confronto"""
+        self.cancel_comparison()
+        for worker in list(self.cancelled_workers):
+            worker.wait()
+        self.cancelled_workers.clear()
+
+    def closeEvent(self, event):
+        self.stop_comparisons()
+        super().closeEvent(event)
+
+    def clear_comparison(self):
+        """Elimina il risultato del confronto precedente"""
+        self.result = None
+        self.txt1 = None
+        self.txt2 = None
+        self.alignment = None
+        self.diff_index = None
+        self.line_indexes = (None, None)
+        self.stream_timer.stop()
+        self.pending_matches.clear()
+        self.shown_rows = [0, 0]
+        self.stream_finished = False
+        self.set_show_all_diffs(self.show_all_diffs)
+        self.scroll_sync.set_mappings()
+
+    def is_current_worker(self):
+        return self.worker is not None and self.sender() is self.worker
+
+    def on_comparison_stage(self, label):
+        if self.is_current_worker():
+            self.statusUpdate.emit(f"🔄 {label}...")
+
+    def on_lines_extracted(self, txt1, txt2):
+        """
+        Il testo dei due documenti è pronto: le righe verranno aggiunte ai
+        pannelli man mano che arrivano i match, in ordine di riga del doc1
+        """
+        if not self.is_current_worker():
+            return
+        self.txt1 = txt1
+        self.txt2 = txt2
+        self.file1.set_lines([])
+        self.file2.set_lines([])
+        self.line_indexes = (LineSpatialIndex(txt1), LineSpatialIndex(txt2))
+
+        # Gli indici crescono con i match: la lista del risultato è l'unica copia
+        self.result = []
+        self.alignment = AlignmentIndex(self.result, len(txt1), len(txt2))
+        self.diff_index = DiffIndex()
+        self.set_show_all_diffs(self.show_all_diffs)
+        # I pannelli hanno già numeri di righe diversi: lo scroll segue subito
+        # l'allineamento, che si aggiorna a ogni match aggiunto da append_pending_rows
+        self.scroll_sync.set_mappings(lambda row: self.alignment.scroll_row(0, row),
+                                      lambda row: self.alignment.scroll_row(1, row))
+
+    def on_matches_found(self, matches):
+        if not self.is_current_worker():
+            return
+        self.pending_matches.extend(matches)
+        if not self.stream_timer.isActive():
+            self.stream_timer.start()
+            self.append_pending_rows()
+
+    def append_pending_rows(self):
+        """
+        Aggiunge ai pannelli un blocco di match ricevuti: le righe del doc1 fino
+        all'ultimo match del blocco (anche quelle senza corrispondenza) e le
+        righe del doc2 fino alla più avanzata tra quelle abbinate
+        """
+        rows1 = []
+        rows2 = []
+        with profiler.stage('popolamento_gui') as stage:
+            for _ in range(min(len(self.pending_matches), STREAM_MATCHES_PER_TICK)):
+                m = self.pending_matches.popleft()
+                self.alignment.append(len(self.result), m)
+                self.diff_index.append(m)
+                self.result.append(m)
+                self.extend_rows(m['doc1'] + 1, m['doc2'] + 1, rows1, rows2)
+            self.file1.append_lines(rows1)
+            self.file2.append_lines(rows2)
+            stage.add_items(len(rows1) + len(rows2))
+
+        if not self.pending_matches:
+            self.stream_timer.stop()
+            if self.stream_finished:
+                self.finish_comparison()
+
+    def extend_rows(self, stop1, stop2, rows1, rows2):
+        """Prepara le righe dei due pannelli fino a stop1 (doc1) e stop2 (doc2) escluse"""
+        start1, start2 = self.shown_rows
+        result1 = self.alignment.result1
+        for i in range(start1, stop1):
+            k = result1[i]
+            prefix = f"score {self.result[k]['score']:.2f}  " if k >= 0 else UNMATCHED_PREFIX
+            rows1.append(prefix + self.txt1[i]['text'])
+        rows2.extend(f"{l['text']} " for l in self.txt2[start2:stop2])
+        self.shown_rows = [max(start1, stop1), max(start2, stop2)]
+
+    def on_comparison_complete(self):
+        if not self.is_current_worker():
+            return
+        self.worker = None
+        self.comparisonRunning.emit(False)
+        self.stream_finished = True
+        if not self.stream_timer.isActive():
+            self.finish_comparison()
+
+    def finish_comparison(self):
+        """Tutti i match sono nei pannelli: aggiunge le righe rimaste e completa gli indici"""
+        rows1 = []
+        rows2 = []
+        self.extend_rows(len(self.txt1), len(self.txt2), rows1, rows2)
+        self.file1.append_lines(rows1)
+        self.file2.append_lines(rows2)
+
+        # Le pagine con differenze vengono renderizzate in anticipo
+        changed = [r for r in self.result if r['diff']]
+        self.file1.set_difference_pages(self.txt1[r['doc1']]['page'] - 1 for r in changed)
+        self.file2.set_difference_pages(self.txt2[r['doc2']]['page'] - 1 for r in changed)
+
+        self.statusUpdate.emit(f"✅ Confronto completato: {len(self.result)} righe abbinate, "
+                               f"{len(changed)} con differenze")
+        if profiler.enabled:
+            profiler.log_report()
+            self.statusUpdate.emit(profiler.summary())
+
+    def on_comparison_cancelled(self):
+        # Il worker annullato è già stato scollegato da cancel_comparison;
+        # il messaggio non deve coprire quello di un nuovo confronto
+        if self.worker is None:
+            self.statusUpdate.emit("Confronto annullato")
+
+    def on_comparison_error(self, message):
+        if not self.is_current_worker():
+            return
+        self.worker = None
+        self.comparisonRunning.emit(False)
+        self.statusUpdate.emit("❌ Errore durante il confronto")
+        QMessageBox.critical(self, "❌ Errore", f"Errore durante il confronto:\n\n{message}")
+
+    def set_show_all_diffs(self, enabled):
+        """Attiva/disattiva la colorazione permanente delle differenze nei due pannelli"""
+        self.show_all_diffs = enabled
+        active = enabled and self.diff_index is not None
+        self.file1.text_viewer.set_span_provider(
+            (lambda row: self.diff_spans(row, 0)) if active else None)
+        self.file2.text_viewer.set_span_provider(
+            (lambda row: self.diff_spans(row, 1)) if active else None)
+
+    def diff_spans(self, row, side):
+        """
+        Intervalli (posizione, numero caratteri, colore) delle differenze della
+        riga nel pannello side, calcolati dall'indice solo per le righe disegnate
+        """
+        if self.diff_index is None:
+            return []
+        k = self.alignment.result_row(side, row)
+        if k < 0 or not self.diff_index.has_diff(k):
+            return []
+        line = self.txt1[row] if side == 0 else self.txt2[row]
+        offset = SCORE_PREFIX_LENGTH if side == 0 else 0
+
+        spans = []
+        for operation, i1, i2, j1, j2 in self.diff_index.row_opcodes(k):
+            start, end = (i1, i2) if side == 0 else (j1, j2)
+            if start == end:
+                continue  # inserimento/cancellazione: nulla da colorare da questo lato
+            start = map_index(line['text'], line['normalized'], start)
+            end = map_index(line['text'], line['normalized'], end)
+            if end > start:
+                spans.append((start + offset, end - start, DIFF_COLORS[operation]))
+        return spans
+
+    def pdf_to_txt(self, pag, x, y, idx):
+        """Riga (base 1) sotto il punto (x, y) della pagina pag (0-based) del documento idx, o -1"""
+        i = self.line_indexes[idx].find(pag + 1, x, y)
+        return i + 1 if i >= 0 else -1
 
     def txt_to_pdf(self, line, idx):
         pages_block = self.txt1 if idx == 0 else self.txt2
@@ -261,69 +463,126 @@ class pdf_compare(QWidget):
 
 
     def click_event1(self, ev, a1, a2, a3):
-        offset = 12
-        r = a1
-        if ev == '1' and self.result:
-            l0 = self.result[a1]
-            #r = l0['doc1']
-            r1 = r #l0['doc2']
-            diff = l0['diff']
-            icol = 0
-            self.file1.text_viewer.clear_highlight()
-            self.file2.text_viewer.clear_highlight()
-            if diff:
-                mes = [f"{df['operation']} {df['text1']} : {df['text2']}" for df in diff]
-                self.statusUpdate.emit(', '.join(mes))
-                for df in diff:
-                    if df['operation'] == 'replace':
-                        p0 = df['position1'][0]
-                        count0 = df['position1'][1] - p0
-                        p0 = map_index(self.txt1[r]['text'], self.txt1[r]['normalized'], p0)
-
-                        p1 = df['position2'][0]
-                        count1 = df['position2'][1] - p1
-                        p1 = map_index(self.txt2[r1]['text'], self.txt2[r1]['normalized'], p1)
-
-                        self.file1.text_viewer.highlight_character_at(a1, p0 + offset, count0, icol)
-                        self.file2.text_viewer.highlight_character_at(a1, p1, count1, icol)
-                        icol += 1
-            #evidenzia pdf
-            self.click_event(ev, r, a2, a3, 0)
-            self.click_event(ev, r1, a2, a3, 1)
+        if ev == '1':
+            # clic sul testo: a1 = riga
+            self.select_line(0, a1)
         else:
             # clic su pdf a1 = x, a2 = y, a3 = pag
             self.click_event(ev, a1, a2, a3, 0)
 
     def click_event2(self, ev, a1, a2, a3):
-        self.click_event(ev, a1, a2, a3, 1)
-
-    def click_event(self, ev, a1, a2, a3, idx):
-        if idx == 0:
-            cnt = self.file1
-            pages_block = self.txt1
+        if ev == '1':
+            self.select_line(1, a1)
         else:
-            cnt = self.file2
-            pages_block = self.txt2
+            self.click_event(ev, a1, a2, a3, 1)
 
+    def click_event(self, ev, a1, a2, a3, idx):
+        pages_block = self.txt1 if idx == 0 else self.txt2
         if not pages_block:
             return
-        if ev == '1':
-            current_page, bbox = self.txt_to_pdf(a1, idx)
-            color = QColor(255, 255, 0, 100)  # Giallo trasparente
-            cnt.highlight_pdf(current_page, bbox, color)
 
-        elif ev == '2':
+        if ev == '2':
             # click sul pdf
-            line = self.pdf_to_txt(a3, a2, pages_block)
-            cnt.highlight_txt(line)
-            current_page, bbox = self.txt_to_pdf(line-1, idx)
-            cnt.highlight_pdf(current_page, bbox, QColor(255, 255, 0, 100))
+            line = self.pdf_to_txt(a3, a1, a2, idx)
+            if line > 0:
+                self.select_line(idx, line - 1)
+
+    def select_line(self, side, line):
+        """
+        Seleziona la riga line del documento side (0 o 1) e la riga abbinata
+        dell'altro documento: le evidenzia nei testi e nei pdf e mostra le
+        differenze. La corrispondenza è letta dall'indice di allineamento.
+        """
+        if self.alignment is None:
+            return
+        lines = [line, line]
+        lines[1 - side] = self.alignment.counterpart(side, line)
+        line1, line2 = lines
 
-            idx1 = (idx +1) % 2
-            cnt1 = self.file2 if cnt == self.file1 else self.file1
-            current_page, bbox = self.txt_to_pdf(line-1, idx1)
-            cnt1.highlight_pdf(current_page, bbox, QColor(255, 255, 0, 100))
-            cnt1.highlight_txt(line)
+        # Lo scroll indotto dalle evidenziazioni non va propagato all'altro pannello
+        self.scroll_sync.enabled = False
+        try:
+            targets = []
+            for cnt, i, idx in ((self.file1, line1, 0), (self.file2, line2, 1)):
+                # Senza corrispondenza nell'altro pannello non deve restare
+                # l'evidenziazione della selezione precedente
+                cnt.clear_highlights()
+                if i >= 0:
+                    cnt.highlight_txt(i + 1)
+                    targets.append((cnt,) + self.txt_to_pdf(i, idx))
+        finally:
+            self.scroll_sync.enabled = True
+
+        k = self.alignment.result_row(side, line)
+        if k < 0:
+            self.statusUpdate.emit("Riga senza corrispondenza nell'altro documento")
+        elif line1 >= 0 and line2 >= 0:
+            diff = self.result[k]['diff']
+            self.highlight_diff(diff, line1, line2)
+            # Nei pdf le parti cambiate vengono cercate dentro la riga evidenziata
+            targets = [target + (self.diff_texts(diff, lines[idx], idx),)
+                       for target, idx in zip(targets, (0, 1))]
+
+        #evidenzia pdf
+        self.navigate_both(targets)
+
+    def diff_texts(self, diff, line, side):
+        """Parti del testo originale della riga cambiate nel documento side"""
+        l = self.txt1[line] if side == 0 else self.txt2[line]
+        position = 'position1' if side == 0 else 'position2'
+        skipped = 'insert' if side == 0 else 'delete'
+        texts = []
+        for df in diff:
+            if df['operation'] == skipped:
+                continue
+            start, end = df[position]
+            start = map_index(l['text'], l['normalized'], start)
+            end = map_index(l['text'], l['normalized'], end)
+            text = l['text'][start:end].strip()
+            if text:
+                texts.append(text)
+        return texts
+
+    def highlight_diff(self, diff, line1, line2):
+        """Evidenzia nei due testi le sostituzioni tra la riga line1 del doc1 e line2 del doc2"""
+        if not diff:
+            return
+        mes = [f"{df['operation']} {df['text1']} : {df['text2']}" for df in diff]
+        self.statusUpdate.emit(', '.join(mes))
+
+        offset = SCORE_PREFIX_LENGTH
+        t1 = self.txt1[line1]
+        t2 = self.txt2[line2]
+        icol = 0
+        for df in diff:
+            if df['operation'] == 'replace':
+                p0 = df['position1'][0]
+                count0 = df['position1'][1] - p0
+                p0 = map_index(t1['text'], t1['normalized'], p0)
+
+                p1 = df['position2'][0]
+                count1 = df['position2'][1] - p1
+                p1 = map_index(t2['text'], t2['normalized'], p1)
+
+                self.file1.text_viewer.highlight_character_at(line1, p0 + offset, count0, icol)
+                self.file2.text_viewer.highlight_character_at(line2, p1, count1, icol)
+                icol += 1
+
+    def navigate_both(self, targets):
+        """
+        targets: lista di (PdfTxtViewer, pagina, bbox) o (PdfTxtViewer, pagina, bbox, testi),
+        con i testi da cercare ed evidenziare dentro la bbox
+        Le pagine mancanti vengono renderizzate contemporaneamente dai thread dei
+        due viewer; le evidenziazioni sono applicate insieme quando sono pronte,
+        nello stesso passaggio del ciclo di eventi, quindi nello stesso frame.
+        """
+        color = QColor(255, 255, 0, 100)  # Giallo trasparente
+
+        def apply():
+            for cnt, page, bbox, *texts in targets:
+                cnt.highlight_pdf(page, bbox, color, *texts)
+
+        self.page_loader.load([(target[0].pdf_viewer, target[1]) for target in targets], apply)
 
 
 class PDFCompareApp(QMainWindow):
@@ -364,6 +623,8 @@ class PDFCompareApp(QMainWindow):
 
         self.file_compare = pdf_compare()
         self.file_compare.statusUpdate.connect(self.statusBarMes)
+        self.file_compare.progressUpdate.connect(self.set_progress)
+        self.file_compare.comparisonRunning.connect(self.set_comparison_running)
         self.tab_widget.addWidget(self.file_compare)
 
         main_layout.addWidget(self.tab_widget)
@@ -414,6 +675,40 @@ class PDFCompareApp(QMainWindow):
         zoom_out_action = view_menu.addAction('Zoom Indietro')
         zoom_out_action.triggered.connect(self.zoom_out_all)
 
+        # Menu Strumenti
+        tools_menu = menubar.addMenu('Strumenti')
+
+        hierarchical_action = tools_menu.addAction('Confronto Gerarchico (Paragrafi, poi Righe)')
+        hierarchical_action.setCheckable(True)
+        hierarchical_action.toggled.connect(self.set_hierarchical_compare)
+
+        all_diffs_action = tools_menu.addAction('Evidenzia Tutte le Differenze')
+        all_diffs_action.setCheckable(True)
+        all_diffs_action.setChecked(self.file_compare.show_all_diffs)
+        all_diffs_action.toggled.connect(self.file_compare.set_show_all_diffs)
+
+        tools_menu.addSeparator()
+
+        self.cancel_action = tools_menu.addAction('Annulla Confronto')
+        self.cancel_action.setEnabled(False)
+        self.cancel_action.triggered.connect(self.file_compare.cancel_comparison)
+
+        tools_menu.addSeparator()
+
+        cache_action = tools_menu.addAction('Memoria Cache Pagine...')
+        cache_action.triggered.connect(self.choose_cache_budget)
+
+        profile_action = tools_menu.addAction('Profilazione Pipeline')
+        profile_action.setCheckable(True)
+        profile_action.setChecked(profiler.enabled)
+        profile_action.toggled.connect(profiler.enable)
+
+        profile_summary_action = tools_menu.addAction('Mostra Tempi Pipeline')
+        profile_summary_action.triggered.connect(self.show_profile_summary)
+
+        trace_action = tools_menu.addAction('Esporta Traccia Chrome...')
+        trace_action.triggered.connect(self.export_profile_trace)
+
         # Menu Aiuto
         help_menu = menubar.addMenu('Aiuto')
 
@@ -429,6 +724,56 @@ class PDFCompareApp(QMainWindow):
     def statusBarMes(self, message):
         self.statusBar().showMessage(message)
 
+    def set_progress(self, value):
+        self.progress_bar.setValue(value)
+
+    def set_comparison_running(self, running):
+        """Mostra la progress bar e abilita l'annullamento durante il confronto"""
+        self.progress_bar.setVisible(running)
+        self.cancel_action.setEnabled(running)
+
+    def set_hierarchical_compare(self, enabled):
+        self.file_compare.compare_mode = 'hierarchical' if enabled else 'lines'
+
+    def pdf_viewers(self):
+        """Viewer pdf dell'estrazione testo e dei due documenti confrontati"""
+        return [self.text_extraction.text_extraction.pdf_viewer,
+                self.file_compare.file1.pdf_viewer,
+                self.file_compare.file2.pdf_viewer]
+
+    def choose_cache_budget(self):
+        """Chiede il budget di memoria della cache delle pagine di ogni viewer"""
+        current = self.pdf_viewers()[0].page_cache.budget_bytes // (1024 * 1024)
+        budget_mb, ok = QInputDialog.getInt(self, "Memoria Cache Pagine",
+                                            "MB per ogni documento aperto:", current, 16, 4096, 16)
+        if ok:
+            for viewer in self.pdf_viewers():
+                viewer.set_cache_budget(budget_mb)
+            self.statusBarMes(f"Cache pagine: {budget_mb} MB per documento")
+
+    def show_profile_summary(self):
+        """
+        Mostra i tempi della pipeline nella status bar e li scrive nel log,
+        insieme allo stato delle cache delle pagine dei documenti confrontati
+        """
+        profiler.log_report()
+        cache_stats = [viewer.page_cache.stats() for viewer in self.pdf_viewers()[1:]]
+        for stats in cache_stats:
+            logging.info(stats)
+        self.statusBarMes(' | '.join([profiler.summary()] + cache_stats))
+
+    def export_profile_trace(self):
+        """Esporta i tempi della pipeline nel formato Chrome Trace"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Esporta Traccia", "pdf_compare_trace.json", "File JSON (*.json);;Tutti i file (*)"
+        )
+        if file_path:
+            try:
+                profiler.export_chrome_trace(file_path)
+                self.statusBarMes(f"Traccia esportata in {file_path}")
+            except Exception as e:
+                QMessageBox.warning(self, "Errore", f"Impossibile esportare la traccia:\n{str(e)}")
+
     '''
     def create_file_section(self) -> QWidget:
         """Crea la sezione per la selezione dei file"""
@@ -588,33 +933,9 @@ class PDFCompareApp(QMainWindow):
             QMessageBox.warning(self, "⚠️ Errore", f"Errore nell'apertura dei file PDF:\n{str(e)}")
             return
 
-        # Disabilita il pulsante e mostra la progress bar
-        self.compare_button.setEnabled(False)
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        self.statusBar().showMessage("🔄 Confronto in corso...")
-
+        # Il confronto gira in background nel widget di confronto
         self.tab_widget.setCurrentIndex(1)
-        self.result, txt1, txt2 = compare_pdf_files(pdf1, pdf2)
-        for r in self.result:
-            t1 = txt1[r['doc1']]['text']
-            t2 = txt2[r['doc2']]['text']
-            score = r['score']
-            self.diff_viewer.print_left(f'score {score:.2f}  {t1}')
-            self.diff_viewer.print_right(f'{t2} ')
-
-        a = 0
-        #self.diff_viewer.load_pdf(pdf1)
-
-        '''
-        # Avvia il worker thread
-        config = self.config_widget.get_config()
-        self.worker = ComparisonWorker(pdf1, pdf2, config)
-        self.worker.progress_updated.connect(self.progress_bar.setValue)
-        self.worker.comparison_complete.connect(self.on_comparison_complete)
-        self.worker.error_occurred.connect(self.on_error)
-        self.worker.start()
-        '''
+        self.file_compare.compare_files(pdf1, pdf2)
 
     def on_comparison_complete(self, differences: List[dict]):
         """Gestisce il completamento del confronto"""
@@ -702,6 +1023,11 @@ class PDFCompareApp(QMainWindow):
         self.diff_viewer.pdf_viewer1.zoom_out_page()
         self.diff_viewer.pdf_viewer2.zoom_out_page()
 
+    def closeEvent(self, event):
+        # Un QThread distrutto mentre è in esecuzione fa terminare il processo
+        self.file_compare.stop_comparisons()
+        super().closeEvent(event)
+
     def show_about(self):
         """Mostra informazioni sull'applicazione"""
         QMessageBox.about(
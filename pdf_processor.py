@@ -1,10 +1,13 @@
-import fitz  # PyMuPDF
 import os
 import re
 from typing import List, Tuple
 import numpy as np
 
-def extract_text_lines_from_pdf(pdf_path, line_height_tolerance=2.0, y_overlap_threshold=0.5):
+from pipeline_profiler import profiler
+from page_analysis import use_document
+
+def extract_text_lines_from_pdf(pdf_path, line_height_tolerance=2.0, y_overlap_threshold=0.5,
+                                progress=None):
     """
     Estrae righe di testo da un PDF OCR, ricostruendo le righe anche quando
     sono composte da più span o blocchi.
@@ -13,6 +16,8 @@ def extract_text_lines_from_pdf(pdf_path, line_height_tolerance=2.0, y_overlap_t
         pdf_path (str): Percorso del file PDF
         line_height_tolerance (float): Tolleranza per raggruppare span sulla stessa riga (punti)
         y_overlap_threshold (float): Soglia di sovrapposizione verticale per considerare span sulla stessa riga
+        progress (callable): Chiamata come progress(pagine_fatte, pagine_totali) dopo ogni
+            pagina; se restituisce True l'estrazione si interrompe
 
     Returns:
         list: Lista di dizionari con 'text', 'bbox', 'page' per ogni riga
@@ -135,44 +140,40 @@ def extract_text_lines_from_pdf(pdf_path, line_height_tolerance=2.0, y_overlap_t
     all_lines = []
 
     try:
-        # Apri il documento PDF
-        doc = fitz.open(pdf_path)
-
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-
-            # Estrai il testo con informazioni dettagliate
-            text_dict = page.get_text("dict")
-
-            # Raccogli tutti gli span da tutti i blocchi
-            page_spans = []
-
-            for block in text_dict["blocks"]:
-                if "lines" in block:  # Blocco di testo
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            if span["text"].strip():  # Solo span con testo
-                                page_spans.append({
-                                    'text': span["text"],
-                                    'bbox': span["bbox"],
-                                    'size': span["size"],
-                                    'font': span["font"]
-                                })
-
-            # Raggruppa gli span in righe
-            text_lines = group_spans_into_lines(page_spans)
-
-            # Converti ogni gruppo di span in una riga finale
-            for line_spans in text_lines:
-                line_data = create_line_from_spans(line_spans)
-                if line_data:
-                    all_lines.append({
-                        'text': line_data['text'],
-                        'bbox': line_data['bbox'],
-                        'page': page_num + 1  # Numerazione pagine da 1
-                    })
-
-        doc.close()
+        # Analisi condivisa del documento (ogni pagina viene letta una sola volta)
+        with use_document(pdf_path) as doc:
+            for page in doc.pages():
+                page_num = page.number
+                with profiler.stage('estrazione_pagina') as stage:
+
+                    # Raccogli tutti gli span da tutti i blocchi
+                    page_spans = []
+
+                    for span in page.spans():
+                        if span["text"].strip():  # Solo span con testo
+                            page_spans.append({
+                                'text': span["text"],
+                                'bbox': span["bbox"],
+                                'size': span["size"],
+                                'font': span["font"]
+                            })
+
+                    # Raggruppa gli span in righe
+                    text_lines = group_spans_into_lines(page_spans)
+
+                    # Converti ogni gruppo di span in una riga finale
+                    for line_spans in text_lines:
+                        line_data = create_line_from_spans(line_spans)
+                        if line_data:
+                            all_lines.append({
+                                'text': line_data['text'],
+                                'bbox': line_data['bbox'],
+                                'page': page_num + 1  # Numerazione pagine da 1
+                            })
+                    stage.add_items(len(text_lines))
+
+                if progress is not None and progress(page_num + 1, len(doc)):
+                    break
 
     except Exception as e:
         print(f"Errore nell'elaborazione del PDF: {e}")
@@ -192,8 +193,9 @@ def normalize_text(text: str) -> str:
     return text.lower()
 
 def normalize_blocks(blocks):
-    for block in blocks:
-        block['normalized'] = normalize_text(block['text'])
+    with profiler.stage('normalizzazione', items=len(blocks)):
+        for block in blocks:
+            block['normalized'] = normalize_text(block['text'])
     return blocks
 
 
@@ -286,6 +288,11 @@ def analizza_struttura_documento(interlinee: List[float]) -> None:
 
 
 def remove_notes(blocks):
+    with profiler.stage('rimozione_note', items=len(blocks)):
+        return _remove_notes(blocks)
+
+
+def _remove_notes(blocks):
     interlinea = []
     current = -1
     page_star_line = []
@@ -4,7 +4,7 @@ from PyQt6.QtGui import QFont
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QSplitter, QFrame
 
 from pdf_viewer import PDFViewer
-from txt_viewer import CustomTextEdit
+from txt_viewer import TextLineView
 
 
 class PdfTxtViewer(QWidget):
@@ -45,10 +45,9 @@ class PdfTxtViewer(QWidget):
 
         self.text_label = QLabel("Testo PDF")
         self.text_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.text_viewer = CustomTextEdit()
+        self.text_viewer = TextLineView()
 
         self.text_viewer.lineClicked.connect(self.text_clicked)
-        self.text_viewer.setReadOnly(True)
         self.text_viewer.setFont(QFont("Courier", 10))  # Font monospace
         text_layout.addWidget(self.text_label)
         text_layout.addWidget(self.text_viewer)
@@ -71,12 +70,21 @@ class PdfTxtViewer(QWidget):
     def pdf_clicked(self, x, y, page):
         self.clicEvent.emit('2', x, y, page)
 
-    def highlight_pdf(self, page, bbox, color):
-        self.pdf_viewer.highlight_text_line(page, bbox, color)
+    def highlight_pdf(self, page, bbox, color, texts=()):
+        self.pdf_viewer.highlight_text_line(page, bbox, color, texts)
 
     def highlight_txt(self, line):
         self.text_viewer.highlight_and_scroll_to_line(line)
 
+    def clear_highlights(self):
+        """Rimuove le evidenziazioni dal testo e dal pdf"""
+        self.text_viewer.clear_highlight()
+        self.pdf_viewer.clear_all_highlights()
+
+    def set_difference_pages(self, pages):
+        """Pagine (0-based) con differenze, da renderizzare in anticipo"""
+        self.pdf_viewer.set_difference_pages(pages)
+
     def show_pdf(self, pdf):
         self.pdf_viewer.load_pdf(pdf)
         basename = os.path.basename(pdf)
@@ -103,6 +111,14 @@ class PdfTxtViewer(QWidget):
     def print_txt(self, txt):
         self.text_viewer.append(txt)
 
+    def set_lines(self, lines):
+        """Sostituisce il testo con le righe indicate, in un'unica operazione"""
+        self.text_viewer.set_lines(lines)
+
+    def append_lines(self, lines):
+        """Aggiunge le righe indicate in fondo al testo"""
+        self.text_viewer.append_lines(lines)
+
     def toggle_sync_scroll(self, enabled: bool):
         """Attiva/disattiva la sincronizzazione dello scroll"""
         # La sincronizzazione è già gestita nel setup_scroll_sync
@@ -1,17 +1,62 @@
+import math
 import sys
+import time
+from bisect import bisect_right
+from collections import Counter
 from multiprocessing.pool import CLOSE
 
 import fitz  # PyMuPDF
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QScrollArea, QLabel,
                              QSlider, QSpinBox, QFileDialog, QFrame)
-from PyQt6.QtCore import Qt, QRect, pyqtSignal
-from PyQt6.QtGui import QPixmap, QPainter, QPen, QColor, QBrush
+from PyQt6.QtCore import Qt, QObject, QRect, QRectF, QPoint, QSize, QTimer, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap, QPainter, QPen, QColor, QBrush
+
+from page_render import (render_page_image, PageRenderCache, BackgroundRenderer,
+                         DEFAULT_CACHE_BUDGET_MB, TILE_SIZE, release_thread_documents)
+from thumbnails import ThumbnailStrip
+from page_analysis import release_document, use_document
+
+# Numero di pagine con differenze successive da renderizzare in anticipo
+PREFETCH_DIFFERENCE_PAGES = 3
+
+# Zoom oltre il quale la pagina viene renderizzata a tasselli (solo quelli visibili)
+TILED_ZOOM_THRESHOLD = 2.0
+
+# Priorità dei tasselli visibili e della pagina corrente rispetto al prefetch
+TILE_PRIORITY = 100
+CURRENT_PAGE_PRIORITY = TILE_PRIORITY
+
+# Zoom dell'anteprima a bassa risoluzione mostrata mentre si renderizza la pagina
+PREVIEW_ZOOM = 0.5
+
+# Sotto questo tempo stimato (ms) la pagina viene renderizzata subito, senza anteprima
+PROGRESSIVE_MIN_MS = 40
+
+MAX_ZOOM = 400
+
+# Attesa (ms) dopo l'ultimo cambio di zoom prima del rendering definitivo
+ZOOM_DEBOUNCE_MS = 150
+
+# Attesa massima (ms) delle pagine in una navigazione sincronizzata tra viewer
+SYNC_NAVIGATION_TIMEOUT_MS = 1000
+
+# Vista continua: spazio tra le pagine (pixel) e pagine renderizzate oltre l'area visibile
+PAGE_GAP = 10
+CONTINUOUS_MARGIN_PAGES = 2
+
+# Colore delle parti di testo cercate dentro la riga evidenziata
+MATCH_HIGHLIGHT_COLOR = QColor(255, 0, 0, 80)
 
 
 class PDFPageWidget(QLabel):
     mouse_click = pyqtSignal(int, int)
-    """Widget per visualizzare una singola pagina PDF con evidenziazioni"""
+    """
+    Widget per visualizzare una singola pagina PDF con evidenziazioni.
+    L'immagine della pagina non viene mai modificata: gli highlight sono uno
+    strato disegnato sopra in paintEvent e ogni modifica ridisegna solo i
+    rettangoli coinvolti.
+    """
 
     def __init__(self):
         super().__init__()
@@ -19,43 +64,91 @@ class PDFPageWidget(QLabel):
         self.current_page_highlights = []  # Highlights solo per la pagina corrente
         self.zoom_factor = 1.0
         self.current_page_num = 0
-        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.tile_provider = None  # callable(col, row) -> QImage o None, in modalità a tasselli
+        self.page_size = QSize()
 
     def set_page(self, page, page_num, zoom_factor=1.0):
         """Imposta la pagina PDF da visualizzare"""
+        # Renderizza la pagina direttamente in una QImage (nessuna codifica intermedia)
+        self.set_image(render_page_image(page, zoom_factor), page_num, zoom_factor)
+
+    def set_image(self, image, page_num, zoom_factor=1.0):
+        """Imposta un'immagine già renderizzata della pagina"""
         self.zoom_factor = zoom_factor
         self.current_page_num = page_num
+        self.tile_provider = None
 
-        # Calcola la matrice di trasformazione per lo zoom
-        mat = fitz.Matrix(zoom_factor, zoom_factor)
+        self.page_pixmap = QPixmap.fromImage(image)
+        self.set_page_size(self.page_pixmap.deviceIndependentSize().toSize())
+
+    def set_tiled_page(self, page_num, zoom_factor, size, tile_provider):
+        """
+        Imposta una pagina renderizzata a tasselli: in paintEvent vengono
+        disegnati solo i tasselli che intersecano l'area da ridisegnare
+        """
+        self.zoom_factor = zoom_factor
+        self.current_page_num = page_num
+        self.page_pixmap = None
+        self.tile_provider = tile_provider
+        self.set_page_size(size)
 
-        # Renderizza la pagina come pixmap
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("ppm")
+    def set_page_size(self, size):
+        self.page_size = size
+        self.setMinimumSize(size)
+        self.resize(size)
+        self.update()
 
-        # Converti in QPixmap
-        pixmap = QPixmap()
-        pixmap.loadFromData(img_data)
+    def clear_page(self):
+        """Rimuove pagina ed evidenziazioni"""
+        self.page_pixmap = None
+        self.tile_provider = None
+        self.current_page_highlights.clear()
+        self.set_page_size(QSize())
+
+    def page_offset(self):
+        """Posizione della pagina nel widget (centrata se il widget è più grande)"""
+        return QPoint(max(0, (self.width() - self.page_size.width()) // 2),
+                      max(0, (self.height() - self.page_size.height()) // 2))
+
+    def tile_rect(self, col, row):
+        """Rettangolo del tassello in pixel logici, relativo alla pagina"""
+        x, y = col * TILE_SIZE, row * TILE_SIZE
+        return QRect(x, y,
+                     min(TILE_SIZE, self.page_size.width() - x),
+                     min(TILE_SIZE, self.page_size.height() - y))
+
+    def visible_tiles(self, rect):
+        """Tasselli (col, row) che intersecano rect (coordinate pagina)"""
+        rect = rect.intersected(QRect(QPoint(0, 0), self.page_size))
+        if rect.isEmpty():
+            return []
+        return [(col, row)
+                for row in range(rect.top() // TILE_SIZE, rect.bottom() // TILE_SIZE + 1)
+                for col in range(rect.left() // TILE_SIZE, rect.right() // TILE_SIZE + 1)]
+
+    def scale_bbox(self, bbox):
+        """Scala una bbox (coordinate PDF) in base al zoom factor"""
+        return tuple(v * self.zoom_factor for v in bbox)
+
+    def highlight_rect(self, scaled_bbox):
+        """Rettangolo dell'highlight nel widget"""
+        x0, y0, x1, y1 = scaled_bbox
+        return QRect(int(x0), int(y0), int(x1 - x0), int(y1 - y0)).translated(self.page_offset())
 
-        self.page_pixmap = pixmap
-        self.update_display()
+    def update_highlights(self, highlights):
+        """Ridisegna solo l'area occupata dagli highlight indicati (bordo compreso)"""
+        for bbox, _ in highlights:
+            self.update(self.highlight_rect(bbox).adjusted(-1, -1, 2, 2))
 
     def set_page_highlights(self, highlights):
         """
         Imposta gli highlight per la pagina corrente
         highlights: lista di (bbox, color) per questa pagina
         """
-        self.current_page_highlights = []
-        for bbox, color in highlights:
-            # Scala la bbox in base al zoom factor
-            scaled_bbox = (
-                bbox[0] * self.zoom_factor,
-                bbox[1] * self.zoom_factor,
-                bbox[2] * self.zoom_factor,
-                bbox[3] * self.zoom_factor
-            )
-            self.current_page_highlights.append((scaled_bbox, color))
-        self.update_display()
+        old = self.current_page_highlights
+        self.current_page_highlights = [(self.scale_bbox(bbox), color) for bbox, color in highlights]
+        self.update_highlights(old)
+        self.update_highlights(self.current_page_highlights)
 
     def add_highlight(self, bbox, color=QColor(255, 255, 0, 100)):
         """
@@ -63,68 +156,199 @@ class PDFPageWidget(QLabel):
         bbox: tupla (x0, y0, x1, y1) nelle coordinate della pagina PDF
         color: QColor per l'evidenziazione
         """
-        # Scala la bbox in base al zoom factor
-        scaled_bbox = (
-            bbox[0] * self.zoom_factor,
-            bbox[1] * self.zoom_factor,
-            bbox[2] * self.zoom_factor,
-            bbox[3] * self.zoom_factor
-        )
-        self.current_page_highlights.append((scaled_bbox, color))
-        self.update_display()
+        highlight = (self.scale_bbox(bbox), color)
+        self.current_page_highlights.append(highlight)
+        self.update_highlights([highlight])
 
     def clear_highlights(self):
         """Rimuove tutte le evidenziazioni della pagina corrente"""
-        self.current_page_highlights.clear()
-        self.update_display()
+        old = self.current_page_highlights
+        self.current_page_highlights = []
+        self.update_highlights(old)
 
     def update_display(self):
-        """Aggiorna la visualizzazione con le evidenziazioni"""
-        if self.page_pixmap is None:
+        """Ridisegna pagina ed evidenziazioni"""
+        self.update()
+
+    def paintEvent(self, event):
+        if self.page_pixmap is None and self.tile_provider is None:
+            super().paintEvent(event)
             return
 
-        # Crea una copia del pixmap originale
-        display_pixmap = self.page_pixmap.copy()
+        offset = self.page_offset()
+        dirty = event.rect()
+        painter = QPainter(self)
+
+        if self.tile_provider is None:
+            # Solo la parte dell'immagine da ridisegnare
+            source = dirty.translated(-offset).intersected(QRect(QPoint(0, 0), self.page_size))
+            if not source.isEmpty():
+                dpr = self.page_pixmap.devicePixelRatio()
+                painter.drawPixmap(QRectF(source.translated(offset)), self.page_pixmap,
+                                   QRectF(source.x() * dpr, source.y() * dpr,
+                                          source.width() * dpr, source.height() * dpr))
+        else:
+            for col, row in self.visible_tiles(dirty.translated(-offset)):
+                target = self.tile_rect(col, row).translated(offset)
+                image = self.tile_provider(col, row)
+                if image is None:
+                    # Tassello non ancora pronto: verrà ridisegnato quando arriva
+                    painter.fillRect(target, Qt.GlobalColor.white)
+                else:
+                    painter.drawImage(QRectF(target), image)
+
+        for bbox, color in self.current_page_highlights:
+            rect = self.highlight_rect(bbox)
+            if not rect.adjusted(-1, -1, 2, 2).intersects(dirty):
+                continue
+            painter.fillRect(rect, QBrush(color))
+            painter.setPen(QPen(color.darker(150), 1))
+            painter.drawRect(rect)
+        painter.end()
 
-        if self.current_page_highlights:
-            painter = QPainter(display_pixmap)
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            # Coordinate relative alla pagina, al netto della centratura
+            p = event.pos() - self.page_offset()
+            self.mouse_click.emit(p.x(), p.y())
 
-            # Disegna ogni evidenziazione
-            for bbox, color in self.current_page_highlights:
-                x0, y0, x1, y1 = bbox
-                rect = QRect(int(x0), int(y0), int(x1 - x0), int(y1 - y0))
 
-                # Imposta il pennello per l'evidenziazione
-                brush = QBrush(color)
-                painter.fillRect(rect, brush)
+class ContinuousPageWidget(QWidget):
+    mouse_click = pyqtSignal(int, int, int)
+    """
+    Vista a scorrimento continuo: i segnaposto di tutte le pagine sono
+    disposti subito in base ai rettangoli delle pagine, ma vengono disegnate
+    (e richieste al renderer) solo le pagine che intersecano l'area visibile.
+    """
 
-                # Opzionale: aggiungi un bordo
-                pen = QPen(color.darker(150), 1)
-                painter.setPen(pen)
-                painter.drawRect(rect)
+    def __init__(self):
+        super().__init__()
+        self.zoom_factor = 1.0
+        self.page_sizes = []  # dimensioni logiche (QSize) delle pagine
+        self.offsets = []  # coordinata y di inizio di ogni pagina
+        self.image_provider = None  # callable(pagina) -> QImage o None
+        self.highlights = {}  # pagina -> [(bbox, colore)] in coordinate PDF
 
-            painter.end()
+    def set_pages(self, page_rects, zoom_factor, image_provider):
+        """Dispone le pagine: page_rects è una lista di (larghezza, altezza) in punti"""
+        self.zoom_factor = zoom_factor
+        self.image_provider = image_provider
+        self.page_sizes = [QSize(math.ceil(w * zoom_factor), math.ceil(h * zoom_factor))
+                           for w, h in page_rects]
+        self.offsets = []
+        y = PAGE_GAP
+        for size in self.page_sizes:
+            self.offsets.append(y)
+            y += size.height() + PAGE_GAP
+
+        width = max((size.width() for size in self.page_sizes), default=0) + 2 * PAGE_GAP
+        self.setMinimumSize(width, y)
+        self.resize(max(width, self.width()), y)
+        self.update()
+
+    def clear_pages(self):
+        self.set_pages([], self.zoom_factor, None)
+        self.highlights = {}
+
+    def page_at(self, y):
+        """Pagina alla coordinata y (la più vicina se y cade tra due pagine)"""
+        if not self.offsets:
+            return -1
+        return max(0, bisect_right(self.offsets, y) - 1)
+
+    def page_rect(self, page_num):
+        """Rettangolo della pagina nel widget (centrata orizzontalmente)"""
+        size = self.page_sizes[page_num]
+        return QRect(max(PAGE_GAP, (self.width() - size.width()) // 2),
+                     self.offsets[page_num], size.width(), size.height())
+
+    def visible_pages(self, top, bottom):
+        """Pagine che intersecano l'intervallo verticale [top, bottom]"""
+        if not self.offsets:
+            return range(0)
+        return range(self.page_at(top), self.page_at(bottom) + 1)
+
+    def highlight_rect(self, page_num, bbox):
+        origin = self.page_rect(page_num).topLeft()
+        x0, y0, x1, y1 = (v * self.zoom_factor for v in bbox)
+        return QRect(int(x0), int(y0), int(x1 - x0), int(y1 - y0)).translated(origin)
+
+    def update_highlights(self, highlights):
+        for page_num, page_highlights in highlights.items():
+            if 0 <= page_num < len(self.page_sizes):
+                for bbox, _ in page_highlights:
+                    self.update(self.highlight_rect(page_num, bbox).adjusted(-1, -1, 2, 2))
+
+    def set_highlights(self, highlights):
+        """Sostituisce gli highlight ({pagina: [(bbox, colore)]}), ridisegnando solo le aree coinvolte"""
+        old = self.highlights
+        self.highlights = {page: list(items) for page, items in highlights.items()}
+        self.update_highlights(old)
+        self.update_highlights(self.highlights)
+
+    def paintEvent(self, event):
+        if self.image_provider is None:
+            return
 
-        self.setPixmap(display_pixmap)
-        self.resize(display_pixmap.size())
+        dirty = event.rect()
+        painter = QPainter(self)
+        for page_num in self.visible_pages(dirty.top(), dirty.bottom()):
+            target = self.page_rect(page_num)
+            if not target.intersects(dirty):
+                continue
+            image = self.image_provider(page_num)
+            if image is None:
+                # Segnaposto finché la pagina non è renderizzata
+                painter.fillRect(target, Qt.GlobalColor.white)
+                painter.setPen(QPen(QColor(200, 200, 200), 1))
+                painter.drawRect(target.adjusted(0, 0, -1, -1))
+            else:
+                painter.drawImage(QRectF(target), image)
+
+            for bbox, color in self.highlights.get(page_num, []):
+                rect = self.highlight_rect(page_num, bbox)
+                painter.fillRect(rect, QBrush(color))
+                painter.setPen(QPen(color.darker(150), 1))
+                painter.drawRect(rect)
+        painter.end()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
-            p = event.pos()
-
-            self.mouse_click.emit(event.pos().x(), event.pos().y())
+            pos = event.pos()
+            page_num = self.page_at(pos.y())
+            if page_num < 0:
+                return
+            rect = self.page_rect(page_num)
+            if rect.contains(pos):
+                self.mouse_click.emit(pos.x() - rect.x(), pos.y() - rect.y(), page_num)
 
 
 class PDFViewer(QWidget):
     mouse_click = pyqtSignal(int, int, int)
     """Widget principale per visualizzare PDF con controlli"""
 
-    def __init__(self):
+    def __init__(self, cache_budget_mb=DEFAULT_CACHE_BUDGET_MB):
         super().__init__()
         self.pdf_document = None
+        self.document_key = None  # chiave del documento nella cache delle pagine
         self.current_page = 0
         self.zoom_factor = 1.0
         self.page_highlights = {}  # Dizionario {page_num: [(bbox, color), ...]}
+        self.page_cache = PageRenderCache(cache_budget_mb)
+        self.renderer = BackgroundRenderer(self.page_cache, parent=self)
+        self.renderer.page_rendered.connect(self.on_page_rendered)
+        self.difference_pages = []  # pagine (0-based) con differenze, ordinate
+        self.preview_ms = {}  # pagina -> tempo di rendering dell'anteprima (ms)
+        self.continuous = False  # vista a scorrimento continuo
+        self.page_rects = None  # (larghezza, altezza) di ogni pagina, calcolate su richiesta
+        self.rendered_zoom = 1.0  # zoom dell'ultimo rendering definitivo
+
+        # Il rendering dopo un cambio di zoom parte solo quando lo zoom smette di cambiare
+        self.zoom_timer = QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(ZOOM_DEBOUNCE_MS)
+        self.zoom_timer.timeout.connect(self.display_page)
+
         self.init_ui()
 
     def init_ui(self):
@@ -144,7 +368,20 @@ class PDFViewer(QWidget):
         self.pdf_page_widget.mouse_click.connect(self.mouse_click_man)
         self.scroll_area.setWidget(self.pdf_page_widget)
 
-        layout.addWidget(self.scroll_area)
+        # Widget per la vista continua (sostituisce pdf_page_widget nell'area di scroll)
+        self.continuous_widget = ContinuousPageWidget()
+        self.continuous_widget.mouse_click.connect(self.continuous_click)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+        # Miniature delle pagine (nascoste finché non vengono attivate dalla toolbar)
+        self.thumbnail_strip = ThumbnailStrip()
+        self.thumbnail_strip.page_selected.connect(self.thumbnail_clicked)
+        self.thumbnail_strip.setVisible(False)
+
+        content = QHBoxLayout()
+        content.addWidget(self.thumbnail_strip)
+        content.addWidget(self.scroll_area)
+        layout.addLayout(content)
         self.setLayout(layout)
 
     def create_toolbar(self):
@@ -188,7 +425,7 @@ class PDFViewer(QWidget):
 
         self.zoom_slider = QSlider(Qt.Orientation.Horizontal)
         self.zoom_slider.setMinimum(25)
-        self.zoom_slider.setMaximum(300)
+        self.zoom_slider.setMaximum(MAX_ZOOM)
         self.zoom_slider.setValue(100)
         self.zoom_slider.valueChanged.connect(self.set_zoom)
         layout.addWidget(self.zoom_slider)
@@ -203,6 +440,17 @@ class PDFViewer(QWidget):
         # Pulsanti per evidenziazioni di test
         layout.addWidget(QLabel("|"))
 
+        self.continuous_btn = QPushButton("Continua")
+        self.continuous_btn.setCheckable(True)
+        self.continuous_btn.setToolTip("Scorrimento continuo tra le pagine")
+        self.continuous_btn.toggled.connect(self.set_continuous)
+        layout.addWidget(self.continuous_btn)
+
+        self.thumbnails_btn = QPushButton("Miniature")
+        self.thumbnails_btn.setCheckable(True)
+        self.thumbnails_btn.toggled.connect(self.toggle_thumbnails)
+        layout.addWidget(self.thumbnails_btn)
+
         layout.addStretch()
         toolbar.setLayout(layout)
         return toolbar
@@ -211,10 +459,14 @@ class PDFViewer(QWidget):
 
         y_scroll_bar = self.scroll_area.verticalScrollBar().value()
 
-        # 3. Calcola la coordinata Y del documento
+        # 3. Calcola le coordinate del documento
+        x_documento = int((x / self.zoom_factor))
         y_documento = int((y / self.zoom_factor))
 
-        self.mouse_click.emit(x, y_documento, self.current_page)
+        self.mouse_click.emit(x_documento, y_documento, self.current_page)
+
+    def continuous_click(self, x, y, page_num):
+        self.mouse_click.emit(int(x / self.zoom_factor), int(y / self.zoom_factor), page_num)
 
     def open_pdf(self):
         """Apre un file PDF"""
@@ -228,10 +480,25 @@ class PDFViewer(QWidget):
     def load_pdf(self, file_path):
         """Carica un file PDF"""
         try:
+            if self.document_key is not None:
+                self.renderer.cancel_pending()
+                self.page_cache.discard_document(self.document_key)
+                release_document(self.document_key)
+                release_thread_documents(self.document_key)
+            self.difference_pages = []
+            self.preview_ms.clear()
+            self.page_rects = None
+            self.continuous_widget.clear_pages()
             self.pdf_document = fitz.open(file_path)
+            self.document_key = file_path
             self.current_page = 0
             self.page_highlights.clear()  # Reset highlights quando si carica nuovo PDF
 
+            # Miniature del nuovo documento (se la colonna è visibile)
+            self.thumbnail_strip.set_document(None, 0)
+            if self.thumbnails_btn.isChecked():
+                self.thumbnail_strip.set_document(file_path, len(self.pdf_document))
+
             # Aggiorna i controlli
             total_pages = len(self.pdf_document)
             self.page_spinbox.setMaximum(total_pages)
@@ -250,14 +517,25 @@ class PDFViewer(QWidget):
             if self.pdf_document is not None:
                 self.pdf_document.close()
                 self.pdf_document = None
+            if self.document_key is not None:
+                self.renderer.cancel_pending()
+                self.page_cache.discard_document(self.document_key)
+                release_document(self.document_key)
+                release_thread_documents(self.document_key)
+                self.document_key = None
+            self.difference_pages = []
+            self.preview_ms.clear()
+            self.page_rects = None
+            self.zoom_timer.stop()
 
             # Reset delle variabili
             self.current_page = 0
             self.page_highlights.clear()
 
             # Pulisci la visualizzazione
-            self.pdf_page_widget.clear()
-            self.pdf_page_widget.current_page_highlights.clear()
+            self.pdf_page_widget.clear_page()
+            self.continuous_widget.clear_pages()
+            self.thumbnail_strip.set_document(None, 0)
 
             # Disabilita i controlli
             self.update_controls_state(False)
@@ -296,17 +574,319 @@ class PDFViewer(QWidget):
         if self.pdf_document is None:
             return
 
+        self.zoom_timer.stop()
+        self.rendered_zoom = self.zoom_factor
+        self.thumbnail_strip.set_current_page(self.current_page)
+
+        if self.continuous:
+            self.display_continuous()
+            return
+
         try:
-            page = self.pdf_document[self.current_page]
-            self.pdf_page_widget.set_page(page, self.current_page, self.zoom_factor)
+            if self.use_tiles():
+                page_rect = self.pdf_document[self.current_page].rect
+                size = QSize(math.ceil(page_rect.width * self.zoom_factor),
+                             math.ceil(page_rect.height * self.zoom_factor))
+                self.pdf_page_widget.set_tiled_page(self.current_page, self.zoom_factor,
+                                                    size, self.render_tile)
+            else:
+                self.show_page_image()
 
             # Carica gli highlight per questa pagina
             page_highlights = self.page_highlights.get(self.current_page, [])
             self.pdf_page_widget.set_page_highlights(page_highlights)
 
+            self.schedule_prefetch()
+
         except Exception as e:
             print(f"Errore nella visualizzazione della pagina: {e}")
 
+    def set_continuous(self, enabled):
+        """Attiva/disattiva la vista a scorrimento continuo"""
+        if enabled == self.continuous:
+            return
+        self.continuous = enabled
+        # takeWidget evita che QScrollArea distrugga il widget sostituito
+        self.scroll_area.takeWidget()
+        if enabled:
+            self.scroll_area.setWidget(self.continuous_widget)
+        else:
+            self.continuous_widget.image_provider = None
+            self.scroll_area.setWidget(self.pdf_page_widget)
+        self.display_page()
+
+    def get_page_rects(self):
+        """Dimensioni (larghezza, altezza) delle pagine, senza renderizzarle"""
+        if self.page_rects is None:
+            doc = self.pdf_document
+            if hasattr(doc, 'page_cropbox'):
+                # Non carica le pagine: veloce anche su documenti di migliaia di pagine
+                rects = (doc.page_cropbox(i) for i in range(len(doc)))
+            else:
+                rects = (doc[i].rect for i in range(len(doc)))
+            self.page_rects = [(r.width, r.height) for r in rects]
+        return self.page_rects
+
+    def display_continuous(self):
+        """Dispone tutte le pagine (se cambiati documento o zoom) e scorre alla pagina corrente"""
+        widget = self.continuous_widget
+        if widget.image_provider is None or widget.zoom_factor != self.zoom_factor \
+                or len(widget.page_sizes) != len(self.pdf_document):
+            widget.set_pages(self.get_page_rects(), self.zoom_factor, self.continuous_image)
+        widget.set_highlights(self.page_highlights)
+        self.scroll_area.verticalScrollBar().setValue(widget.offsets[self.current_page] - PAGE_GAP)
+        self.schedule_visible_pages()
+
+    def continuous_image(self, page_num):
+        """
+        Immagine della pagina per la vista continua: dalla cache, oppure
+        l'anteprima se disponibile mentre la pagina è richiesta in background
+        """
+        key = self.page_cache_key(page_num)
+        image = self.page_cache.get(key)
+        if image is None:
+            if not self.zoom_timer.isActive():
+                self.renderer.request(key, self.document_key, page_num, self.zoom_factor,
+                                      key[3], priority=CURRENT_PAGE_PRIORITY)
+            image = self.cached_page_image(page_num)
+        return image
+
+    def cached_page_image(self, page_num):
+        """
+        Immagine già disponibile della pagina, da scalare: quella dell'ultimo
+        zoom renderizzato, altrimenti l'anteprima se in cache, altrimenti None
+        """
+        key = self.page_cache_key(page_num, self.rendered_zoom)
+        image = self.page_cache.get(key)
+        if image is not None:
+            return image
+        return self.page_cache.get((self.document_key, page_num, 'anteprima'))
+
+    def visible_page_range(self, margin=0):
+        """Prima e ultima pagina nell'area visibile della vista continua, più margin"""
+        top = self.scroll_area.verticalScrollBar().value()
+        bottom = top + self.scroll_area.viewport().height()
+        pages = self.continuous_widget.visible_pages(top, bottom)
+        last_page = len(self.pdf_document) - 1
+        return max(0, pages.start - margin), min(last_page, pages.stop - 1 + margin)
+
+    def schedule_visible_pages(self):
+        """
+        Richiede le pagine visibili e quelle vicine, annullando le richieste per
+        pagine ormai lontane: restano in memoria solo quelle nella cache LRU
+        """
+        if self.zoom_timer.isActive():
+            # Zoom in corso: si renderizza solo al valore definitivo
+            return
+
+        first, last = self.visible_page_range(CONTINUOUS_MARGIN_PAGES)
+        visible_first, visible_last = self.visible_page_range()
+        keys = {self.page_cache_key(page): page for page in range(first, last + 1)}
+        self.renderer.cancel_pending(keep=keys)
+
+        dpr = self.devicePixelRatioF()
+        for key, page in keys.items():
+            visible = visible_first <= page <= visible_last
+            self.renderer.request(key, self.document_key, page, self.zoom_factor, dpr,
+                                  priority=CURRENT_PAGE_PRIORITY if visible else 0)
+
+    def on_scroll(self, value):
+        """Nella vista continua aggiorna la pagina corrente e le pagine da renderizzare"""
+        if not self.continuous or self.pdf_document is None:
+            return
+        widget = self.continuous_widget
+        center = value + self.scroll_area.viewport().height() // 2
+        page_num = widget.page_at(center)
+        if page_num >= 0 and page_num != self.current_page:
+            self.current_page = page_num
+            self.page_spinbox.blockSignals(True)
+            self.page_spinbox.setValue(page_num + 1)
+            self.page_spinbox.blockSignals(False)
+        self.schedule_visible_pages()
+
+    def page_cache_key(self, page_num, zoom_factor=None):
+        """Chiave della cache: (documento, pagina, zoom, device pixel ratio)"""
+        if zoom_factor is None:
+            zoom_factor = self.zoom_factor
+        return (self.document_key, page_num, round(zoom_factor, 4), self.devicePixelRatioF())
+
+    def render_page(self, page_num):
+        """
+        Restituisce l'immagine della pagina allo zoom corrente, dalla cache se
+        disponibile, altrimenti renderizzandola alla risoluzione dello schermo
+        """
+        key = self.page_cache_key(page_num)
+        image = self.page_cache.get(key)
+        if image is None:
+            dpr = key[3]
+            image = render_page_image(self.pdf_document[page_num], self.zoom_factor * dpr)
+            image.setDevicePixelRatio(dpr)
+            self.page_cache.put(key, image)
+        return image
+
+    def render_preview(self, page_num):
+        """Anteprima a bassa risoluzione della pagina, indipendente dallo zoom"""
+        key = (self.document_key, page_num, 'anteprima')
+        image = self.page_cache.get(key)
+        if image is None:
+            start = time.perf_counter()
+            image = render_page_image(self.pdf_document[page_num], PREVIEW_ZOOM)
+            self.preview_ms[page_num] = (time.perf_counter() - start) * 1000
+            self.page_cache.put(key, image)
+        return image
+
+    def show_page_image(self):
+        """
+        Mostra la pagina corrente. Se non è in cache e il rendering completo è
+        stimato lento, mostra subito l'anteprima e renderizza la pagina in
+        background: l'immagine definitiva la sostituisce in on_page_rendered.
+        """
+        key = self.page_cache_key(self.current_page)
+        image = self.page_cache.get(key)
+        if image is None:
+            preview = self.render_preview(self.current_page)
+            # Il costo di rendering cresce con l'area, cioè col quadrato della scala
+            scale = self.zoom_factor * key[3] / PREVIEW_ZOOM
+            estimate_ms = self.preview_ms.get(self.current_page, 0) * scale * scale
+
+            if estimate_ms < PROGRESSIVE_MIN_MS and not self.renderer.is_pending(key):
+                image = self.render_page(self.current_page)
+            else:
+                # L'anteprima viene scalata alla dimensione logica della pagina
+                image = QImage(preview)
+                image.setDevicePixelRatio(PREVIEW_ZOOM / self.zoom_factor)
+                self.renderer.cancel(key)  # se era in coda come prefetch, la si anticipa
+                self.renderer.request(key, self.document_key, self.current_page,
+                                      self.zoom_factor, key[3], priority=CURRENT_PAGE_PRIORITY)
+
+        self.pdf_page_widget.set_image(image, self.current_page, self.zoom_factor)
+
+    def prepare_page(self, page_num):
+        """
+        Avvia in background il rendering della pagina se servirà per mostrarla.
+        Restituisce la chiave da attendere, o None se la pagina è già pronta
+        (in cache, già visualizzata o mostrata a tasselli).
+        """
+        if self.pdf_document is None or not 0 <= page_num < len(self.pdf_document):
+            return None
+        if not self.continuous and (page_num == self.current_page or self.use_tiles()):
+            return None
+
+        key = self.page_cache_key(page_num)
+        if key in self.page_cache:
+            return None
+        self.renderer.cancel(key)  # se era in coda come prefetch, la si anticipa
+        self.renderer.request(key, self.document_key, page_num, self.zoom_factor,
+                              key[3], priority=CURRENT_PAGE_PRIORITY)
+        return key
+
+    def use_tiles(self):
+        """Ad alto zoom si renderizzano solo i tasselli visibili"""
+        return self.zoom_factor >= TILED_ZOOM_THRESHOLD
+
+    def render_tile(self, col, row):
+        """
+        Restituisce il tassello (col, row) della pagina corrente se in cache,
+        altrimenti ne richiede il rendering in background e restituisce None
+        """
+        key = self.page_cache_key(self.current_page) + (col, row)
+        image = self.page_cache.get(key)
+        if image is None:
+            rect = self.pdf_page_widget.tile_rect(col, row)
+            page_rect = self.pdf_document[self.current_page].rect
+            clip = fitz.Rect(page_rect.x0 + rect.left() / self.zoom_factor,
+                             page_rect.y0 + rect.top() / self.zoom_factor,
+                             page_rect.x0 + (rect.left() + rect.width()) / self.zoom_factor,
+                             page_rect.y0 + (rect.top() + rect.height()) / self.zoom_factor)
+            self.renderer.request(key, self.document_key, self.current_page, self.zoom_factor,
+                                  key[3], clip=clip, priority=TILE_PRIORITY)
+        return image
+
+    def on_page_rendered(self, key, image):
+        """
+        Sostituisce l'anteprima con la pagina appena renderizzata, o ridisegna
+        il tassello, se appartengono alla pagina visualizzata
+        """
+        if self.continuous:
+            if len(key) == 4 and key[2:] == self.page_cache_key(0)[2:] \
+                    and key[0] == self.document_key:
+                self.continuous_widget.update(self.continuous_widget.page_rect(key[1]))
+            return
+
+        widget = self.pdf_page_widget
+        current = self.page_cache_key(self.current_page)
+        if widget.tile_provider is None:
+            if key == current:
+                widget.set_image(image, self.current_page, self.zoom_factor)
+        elif len(key) == 6 and key[:4] == current:
+            widget.update(widget.tile_rect(key[4], key[5]).translated(widget.page_offset()))
+
+    def set_difference_pages(self, pages):
+        """
+        Imposta le pagine (0-based) che contengono differenze, una volta per
+        ogni differenza: usate per il prefetch e per colorare le miniature
+        """
+        counts = Counter(pages)
+        self.difference_pages = sorted(counts)
+        self.thumbnail_strip.set_difference_counts(counts)
+        self.schedule_prefetch()
+
+    def toggle_thumbnails(self, enabled):
+        """Mostra/nasconde le miniature, caricandole alla prima apertura"""
+        self.thumbnail_strip.setVisible(enabled)
+        if enabled and self.pdf_document is not None \
+                and self.thumbnail_strip.path != self.document_key:
+            self.thumbnail_strip.set_document(self.document_key, len(self.pdf_document))
+            self.thumbnail_strip.set_current_page(self.current_page)
+
+    def thumbnail_clicked(self, page_num):
+        if self.pdf_document is not None and page_num != self.current_page:
+            self.page_spinbox.setValue(page_num + 1)
+
+    def predict_pages(self, count=PREFETCH_DIFFERENCE_PAGES):
+        """
+        Pagine che probabilmente verranno visualizzate a breve, in ordine di
+        priorità: pagine adiacenti e pagine con le prossime differenze
+        """
+        n_pages = len(self.pdf_document)
+        current = self.current_page
+        candidates = [current + 1, current - 1, current + 2]
+
+        start = bisect_right(self.difference_pages, current)
+        candidates.extend(self.difference_pages[start:start + count])
+
+        pages = []
+        for page in candidates:
+            if 0 <= page < n_pages and page != current and page not in pages:
+                pages.append(page)
+        return pages
+
+    def schedule_prefetch(self):
+        """Renderizza in background le pagine previste, annullando le richieste superate"""
+        if self.pdf_document is None:
+            return
+
+        if self.use_tiles():
+            # Ad alto zoom niente prefetch di pagine intere (bitmap troppo grandi):
+            # si annullano solo le richieste che non riguardano la pagina corrente
+            current = self.page_cache_key(self.current_page)
+            self.renderer.cancel_where(lambda key: key[:4] != current)
+            return
+
+        pages = self.predict_pages()
+        keys = [self.page_cache_key(page) for page in pages]
+        # Il rendering della pagina corrente (se in corso) non va annullato
+        self.renderer.cancel_pending(keep=keys + [self.page_cache_key(self.current_page)])
+
+        dpr = self.devicePixelRatioF()
+        for priority, (page, key) in enumerate(zip(pages, keys)):
+            self.renderer.request(key, self.document_key, page, self.zoom_factor, dpr,
+                                  priority=len(pages) - priority)
+
+    def set_cache_budget(self, budget_mb):
+        """Imposta il budget di memoria (MB) della cache delle pagine"""
+        self.page_cache.set_budget(budget_mb)
+
     def prev_page(self):
         """Vai alla pagina precedente"""
         if self.pdf_document and self.current_page > 0:
@@ -330,7 +910,7 @@ class PDFViewer(QWidget):
 
     def zoom_in(self):
         """Aumenta lo zoom"""
-        new_value = min(self.zoom_slider.value() + 25, 300)
+        new_value = min(self.zoom_slider.value() + 25, MAX_ZOOM)
         self.zoom_slider.setValue(new_value)
 
     def zoom_out(self):
@@ -339,12 +919,58 @@ class PDFViewer(QWidget):
         self.zoom_slider.setValue(new_value)
 
     def set_zoom(self, value):
-        """Imposta il livello di zoom"""
+        """
+        Imposta il livello di zoom: l'immagine già renderizzata viene subito
+        scalata come anteprima, il rendering nitido parte dopo ZOOM_DEBOUNCE_MS
+        dall'ultimo cambio (i rendering ancora in coda vengono annullati)
+        """
         self.zoom_factor = value / 100.0
         self.zoom_label.setText(f"{value}%")
-        self.display_page()
+        if self.pdf_document is None:
+            return
+
+        self.renderer.cancel_pending()
+        self.zoom_timer.start()
+        self.show_zoom_preview()
+
+    def show_zoom_preview(self):
+        """Mostra la pagina corrente scalando un'immagine già disponibile al nuovo zoom"""
+        if self.continuous:
+            # Nuova disposizione delle pagine, con le immagini in cache scalate
+            self.display_continuous()
+            return
 
-    def highlight_text_line(self, page_num, bbox, color=QColor(255, 255, 0, 100)):
+        page_num = self.current_page
+        image = self.page_cache.get(self.page_cache_key(page_num, self.rendered_zoom))
+        if image is not None:
+            scale = self.rendered_zoom * image.devicePixelRatio()
+        else:
+            image = self.render_preview(page_num)
+            scale = PREVIEW_ZOOM
+
+        # Cambiando il device pixel ratio l'immagine occupa la dimensione logica del nuovo zoom
+        image = QImage(image)
+        image.setDevicePixelRatio(scale / self.zoom_factor)
+        self.pdf_page_widget.set_image(image, page_num, self.zoom_factor)
+        self.pdf_page_widget.set_page_highlights(self.page_highlights.get(page_num, []))
+
+    def search_rects(self, page_num, texts, clip=None):
+        """
+        Rettangoli (coordinate PDF) delle occorrenze dei testi nella pagina,
+        limitate all'area clip: la ricerca riusa il TextPage dell'analisi
+        condivisa, già calcolato dall'estrazione del testo
+        """
+        rects = []
+        try:
+            with use_document(self.document_key) as doc:
+                page = doc.page(page_num)
+                for text in texts:
+                    rects.extend(tuple(r) for r in page.search(text, clip=clip))
+        except Exception as e:
+            print(f"Errore nella ricerca nella pagina {page_num}: {e}")
+        return rects
+
+    def highlight_text_line(self, page_num, bbox, color=QColor(255, 255, 0, 100), texts=()):
         """
         Evidenzia una riga di testo specificando pagina, bounding box e colore
 
@@ -352,6 +978,7 @@ class PDFViewer(QWidget):
             page_num: numero della pagina (0-based)
             bbox: tupla (x0, y0, x1, y1) nelle coordinate della pagina PDF
             color: QColor per l'evidenziazione (default: giallo trasparente)
+            texts: parti del testo della riga da evidenziare anche singolarmente
         """
         if self.pdf_document is None:
             #print("Nessun PDF caricato")
@@ -361,22 +988,25 @@ class PDFViewer(QWidget):
             #print(f"Numero pagina non valido: {page_num}")
             return
 
-        # Aggiungi l'highlight al dizionario della pagina specifica
-        self.page_highlights = {}
-        self.clear_all_highlights()
-        if page_num not in self.page_highlights:
-            self.page_highlights[page_num] = []
-
-        self.page_highlights[page_num].append((bbox, color))
+        # L'highlight sostituisce quelli precedenti; la pagina non viene renderizzata
+        # di nuovo se è già visualizzata: cambia solo lo strato delle evidenziazioni
+        highlights = [(bbox, color)]
+        if texts:
+            highlights.extend((rect, MATCH_HIGHLIGHT_COLOR)
+                              for rect in self.search_rects(page_num, texts, clip=bbox))
+        self.page_highlights = {page_num: highlights}
+
+        if self.continuous:
+            self.continuous_widget.set_highlights(self.page_highlights)
+            self.scroll_to_page_bbox(page_num, bbox)
+            return
 
         if page_num != self.current_page:
             self.goto_page(page_num + 1)
+        else:
+            self.pdf_page_widget.set_page_highlights(self.page_highlights[page_num])
         self.scroll_to_bbox(bbox)
 
-        # Se stiamo visualizzando questa pagina, aggiorna la visualizzazione
-        if page_num == self.current_page:
-            self.pdf_page_widget.add_highlight(bbox, color)
-
     def clear_page_highlights(self, page_num=None):
         """
         Rimuove le evidenziazioni da una pagina specifica o dalla pagina corrente
@@ -391,13 +1021,16 @@ class PDFViewer(QWidget):
             del self.page_highlights[page_num]
 
         # Se stiamo visualizzando questa pagina, aggiorna la visualizzazione
-        if page_num == self.current_page:
+        if self.continuous:
+            self.continuous_widget.set_highlights(self.page_highlights)
+        elif page_num == self.current_page:
             self.pdf_page_widget.clear_highlights()
 
     def clear_all_highlights(self):
         """Rimuove tutte le evidenziazioni da tutte le pagine"""
         self.page_highlights.clear()
         self.pdf_page_widget.clear_highlights()
+        self.continuous_widget.set_highlights({})
 
     def get_page_highlights(self, page_num):
         """
@@ -432,6 +1065,13 @@ class PDFViewer(QWidget):
         """Rimuove tutte le evidenziazioni della pagina corrente"""
         self.clear_page_highlights()
 
+    def scroll_to_page_bbox(self, page_num, bbox):
+        """Vista continua: centra la bbox della pagina indicata nell'area visibile"""
+        rect = self.continuous_widget.highlight_rect(page_num, bbox)
+        viewport = self.scroll_area.viewport()
+        self.scroll_area.ensureVisible(rect.center().x(), rect.center().y(),
+                                       viewport.width() // 2, viewport.height() // 2)
+
     def scroll_to_bbox(self, bbox):
         """
         Fa scroll per assicurarsi che una bbox sia visibile nell'area di visualizzazione
@@ -518,7 +1158,70 @@ class PDFViewer(QWidget):
 
         # Ottieni la bbox dell'highlight e fai scroll
         bbox, _ = highlights[highlight_index]
-        self.scroll_to_bbox(bbox)
+        if self.continuous:
+            self.scroll_to_page_bbox(page_num, bbox)
+        else:
+            self.scroll_to_bbox(bbox)
+
+
+class SyncedPageLoader(QObject):
+    """
+    Prepara in parallelo le pagine di più viewer (ognuno col proprio thread di
+    rendering) ed esegue la navigazione solo quando sono tutte pronte, così i
+    pannelli si aggiornano insieme. Una nuova richiesta sostituisce quella in
+    attesa; dopo SYNC_NAVIGATION_TIMEOUT_MS la navigazione viene eseguita comunque.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pending = set()  # (renderer, chiave) ancora da completare
+        self._apply = None
+        self._connections = []
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SYNC_NAVIGATION_TIMEOUT_MS)
+        self._timer.timeout.connect(self._finish)
+
+    def load(self, requests, apply):
+        """
+        requests: lista di (PDFViewer, pagina 0-based)
+        apply: funzione senza argomenti da eseguire quando le pagine sono pronte
+        """
+        self._reset()
+        self._apply = apply
+        for viewer, page_num in requests:
+            key = viewer.prepare_page(page_num)
+            if key is None:
+                continue
+            renderer = viewer.renderer
+            if not any(r is renderer for r, _ in self._pending):
+                self._connections.append((renderer, renderer.job_finished.connect(
+                    lambda k, image, r=renderer: self._on_job_finished(r, k))))
+            self._pending.add((renderer, key))
+
+        if self._pending:
+            self._timer.start()
+        else:
+            self._finish()
+
+    def _on_job_finished(self, renderer, key):
+        self._pending.discard((renderer, key))
+        if not self._pending:
+            self._finish()
+
+    def _finish(self):
+        apply = self._apply
+        self._reset()
+        if apply is not None:
+            apply()
+
+    def _reset(self):
+        self._timer.stop()
+        for renderer, connection in self._connections:
+            renderer.job_finished.disconnect(connection)
+        self._connections = []
+        self._pending = set()
+        self._apply = None
 
 
 class MainWindow(QMainWindow):
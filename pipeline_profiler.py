@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class _NullStage:
+    """Contesto vuoto restituito quando la profilazione è disattivata"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add_items(self, count):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Misura il tempo di uno stadio della pipeline"""
+    __slots__ = ('profiler', 'name', 'items', 'start')
+
+    def __init__(self, profiler, name, items):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._record(self.name, self.start, time.perf_counter_ns(), self.items)
+        return False
+
+    def add_items(self, count):
+        self.items += count
+
+
+class PipelineProfiler:
+    """
+    Raccoglie tempo, numero di chiamate ed elementi elaborati per ogni stadio
+    della pipeline di confronto. Disattivato di default: in quel caso stage()
+    restituisce un contesto vuoto condiviso e count() ritorna subito.
+    """
+
+    def __init__(self, enabled: bool = False, max_events: int = 200000):
+        self.enabled = enabled
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Azzera statistiche ed eventi"""
+        with self._lock:
+            self.stats = {}  # nome -> [tempo_ns, chiamate, elementi]
+            self.events = []  # (nome, inizio_ns, durata_ns, elementi, thread_id)
+            self._origin = time.perf_counter_ns()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def stage(self, name: str, items: int = 0):
+        """
+        Contesto che misura uno stadio:
+
+            with profiler.stage('estrazione', items=n) as st:
+                ...
+                st.add_items(k)
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, items)
+
+    def count(self, name: str, calls: int = 1, items: int = 0):
+        """Aggiorna solo i contatori di uno stadio, senza misurare il tempo"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self.stats.setdefault(name, [0, 0, 0])
+            entry[1] += calls
+            entry[2] += items
+
+    def _record(self, name, start, end, items):
+        duration = end - start
+        with self._lock:
+            entry = self.stats.setdefault(name, [0, 0, 0])
+            entry[0] += duration
+            entry[1] += 1
+            entry[2] += items
+            if len(self.events) < self.max_events:
+                self.events.append((name, start, duration, items, threading.get_ident()))
+
+    def summary(self) -> str:
+        """Riassunto su una riga, adatto alla status bar"""
+        with self._lock:
+            stats = sorted(self.stats.items(), key=lambda kv: kv[1][0], reverse=True)
+        parts = []
+        for name, (ns, calls, items) in stats:
+            if ns:
+                parts.append(f"{name} {ns / 1e9:.2f}s ({calls}×)")
+            else:
+                parts.append(f"{name} {calls}×")
+        return ' | '.join(parts) if parts else "Nessun dato di profilazione"
+
+    def report(self) -> str:
+        """Tabella con tempo totale, chiamate ed elementi per stadio"""
+        with self._lock:
+            stats = sorted(self.stats.items(), key=lambda kv: kv[1][0], reverse=True)
+        lines = [f"{'stadio':<24}{'tempo (s)':>12}{'chiamate':>12}{'elementi':>12}"]
+        for name, (ns, calls, items) in stats:
+            lines.append(f"{name:<24}{ns / 1e9:>12.3f}{calls:>12}{items:>12}")
+        return '\n'.join(lines)
+
+    def log_report(self, logger: logging.Logger = None):
+        """Scrive il report nel log (pdf_compare.log quando configurato dall'applicazione)"""
+        logger = logger or logging.getLogger(__name__)
+        for line in self.report().split('\n'):
+            logger.info(line)
+
+    def export_chrome_trace(self, path: str):
+        """
+        Esporta gli eventi nel formato Chrome Trace (chrome://tracing, Perfetto)
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            stats = dict(self.stats)
+            origin = self._origin
+
+        trace = []
+        for name, start, duration, items, tid in events:
+            trace.append({
+                'name': name,
+                'cat': 'pipeline',
+                'ph': 'X',
+                'ts': (start - origin) / 1000.0,
+                'dur': duration / 1000.0,
+                'pid': pid,
+                'tid': tid,
+                'args': {'items': items}
+            })
+        # I contatori senza tempo (solo chiamate ed elementi) diventano eventi
+        # contatore ('C') all'inizio della traccia
+        for name, (ns, calls, items) in stats.items():
+            if not ns:
+                trace.append({
+                    'name': name,
+                    'cat': 'counter',
+                    'ph': 'C',
+                    'ts': 0,
+                    'pid': pid,
+                    'args': {'calls': calls, 'items': items}
+                })
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+# Istanza condivisa; si attiva anche con la variabile d'ambiente PDFCOMPARE_PROFILE=1
+profiler = PipelineProfiler(enabled=os.environ.get('PDFCOMPARE_PROFILE', '') not in ('', '0'))
@@ -0,0 +1,83 @@
+"""
+Misura la latenza di rendering per pagina a diversi livelli di zoom,
+confrontando il vecchio percorso (Pixmap -> PPM -> QPixmap.loadFromData)
+con la conversione diretta dei campioni in QImage.
+
+Uso:
+    python render_benchmark.py documento.pdf --pages 20 --zoom 1 2 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+# Permette l'esecuzione senza display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtGui import QGuiApplication, QPixmap
+
+from page_render import pixmap_to_qimage
+
+
+def render_via_ppm(page, zoom):
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    pixmap = QPixmap()
+    pixmap.loadFromData(pix.tobytes("ppm"))
+    return pixmap
+
+
+def render_direct(page, zoom):
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return QPixmap.fromImage(pixmap_to_qimage(pix))
+
+
+def rasterize_only(page, zoom):
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+
+
+METHODS = {
+    'solo get_pixmap': rasterize_only,
+    'ppm + loadFromData': render_via_ppm,
+    'QImage diretta': render_direct,
+}
+
+
+def run_benchmark(pdf_path, n_pages=10, zooms=(1.0, 2.0, 4.0)):
+    """Restituisce {(metodo, zoom): [millisecondi per pagina]}"""
+    doc = fitz.open(pdf_path)
+    pages = [doc[i] for i in range(min(n_pages, doc.page_count))]
+    results = {}
+    for zoom in zooms:
+        for name, method in METHODS.items():
+            method(pages[0], zoom)  # riscaldamento
+            times = []
+            for page in pages:
+                start = time.perf_counter()
+                method(page, zoom)
+                times.append((time.perf_counter() - start) * 1000)
+            results[(name, zoom)] = times
+    doc.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latenza di rendering per pagina")
+    parser.add_argument('pdf')
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--zoom', type=float, nargs='+', default=[1.0, 2.0, 4.0])
+    args = parser.parse_args()
+
+    app = QGuiApplication(sys.argv)
+    results = run_benchmark(args.pdf, args.pages, args.zoom)
+
+    print(f"{'metodo':<22}{'zoom':>7}{'media (ms)':>12}{'mediana (ms)':>14}{'max (ms)':>10}")
+    for (name, zoom), times in results.items():
+        print(f"{name:<22}{zoom * 100:>6.0f}%{statistics.mean(times):>12.1f}"
+              f"{statistics.median(times):>14.1f}{max(times):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
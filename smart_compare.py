@@ -1,10 +1,20 @@
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Iterator, Tuple, Any
 from difflib import SequenceMatcher
 import logging
-import fitz  # PyMuPDF
 import re
 
 from smart_segmentation import PDFTextSegmenter
+from pipeline_profiler import profiler
+from page_analysis import use_document
+
+# Ogni quante righe confrontate si segnala l'avanzamento e si controlla l'annullamento
+PROGRESS_INTERVAL = 25
+# Ogni quanti candidati si controlla l'annullamento durante la ricerca di una riga
+CANCEL_CHECK_INTERVAL = 256
+
+
+class ComparisonCancelled(Exception):
+    """Sollevata quando il confronto viene annullato dall'esterno"""
 
 
 class PDFTextExtractor:
@@ -38,40 +48,30 @@ class PDFTextExtractor:
         pages_text = []
 
         try:
-            doc = fitz.open(pdf_path)
-
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-
-                # Estrai testo con informazioni di posizione
-                text_dict = page.get_text("dict")
-                blocks = text_dict.get("blocks", [])
-
-                # Raccogli tutti i blocchi di testo con posizione
-                text_blocks = []
-                for block in blocks:
-                    if "lines" in block:  # Blocco di testo
-                        for line in block["lines"]:
-                            line_text = ""
-                            for span in line["spans"]:
-                                line_text += span["text"]
-                            if line_text.strip():
-                                text_blocks.append({
-                                    'text': line_text.strip(),
-                                    'bbox': line["bbox"]
-                                })
-
-                # Ordina per posizione Y (top) poi X (left)
-                text_blocks.sort(key=lambda x: (x['bbox'][1], x['bbox'][0]))
-
-                # Estrai solo il testo ordinato
-                page_lines = [block['text'] for block in text_blocks]
-
-                # Pulisci e unisci il testo della pagina
-                page_text = self.clean_text_lines(page_lines, page_num + 1)
-                pages_text.append(page_text)
-
-            doc.close()
+            # Analisi condivisa: il testo di ogni pagina viene letto una sola volta
+            with use_document(pdf_path) as doc:
+                for page in doc.pages():
+                    page_num = page.number
+                    # Raccogli tutte le righe di testo con posizione
+                    text_blocks = []
+                    for line in page.lines():
+                        line_text = "".join(span["text"] for span in line["spans"])
+                        if line_text.strip():
+                            text_blocks.append({
+                                'text': line_text.strip(),
+                                'bbox': line["bbox"]
+                            })
+
+                    # Ordina per posizione Y (top) poi X (left)
+                    text_blocks.sort(key=lambda x: (x['bbox'][1], x['bbox'][0]))
+
+                    # Estrai solo il testo ordinato
+                    page_lines = [block['text'] for block in text_blocks]
+
+                    # Pulisci e unisci il testo della pagina
+                    page_text = self.clean_text_lines(page_lines, page_num + 1)
+                    pages_text.append(page_text)
+
             return pages_text, True
 
         except Exception as e:
@@ -82,16 +82,39 @@ class PDFTextExtractor:
 class PDFComparator:
     """Classe per il confronto di testi estratti da PDF"""
 
-    def __init__(self, similarity_threshold: float = 0.7, min_block_words: int = 3):
+    def __init__(self, similarity_threshold: float = 0.7, min_block_words: int = 3,
+                 progress=None, cancel_event=None):
         """
         Inizializza il comparatore
 
         Args:
             similarity_threshold: Soglia di similarità per considerare due blocchi simili
             min_block_words: Numero minimo di parole per considerare un blocco valido
+            progress: Chiamata come progress(stadio, fatti, totale) durante il confronto
+            cancel_event: threading.Event che, se impostato, interrompe il confronto
+                          con ComparisonCancelled
         """
         self.similarity_threshold = similarity_threshold
         self.min_block_words = min_block_words
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.lines_done = 0  # righe del doc1 già confrontate
+        self.lines_total = 0  # righe del doc1 da confrontare (per l'avanzamento)
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ComparisonCancelled()
+
+    def report(self, stage: str, done: int, total: int):
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    def line_done(self):
+        """Conta una riga del doc1 confrontata; ogni tanto segnala l'avanzamento"""
+        self.lines_done += 1
+        if self.lines_done % PROGRESS_INTERVAL == 0:
+            self.check_cancelled()
+            self.report('confronto', self.lines_done, self.lines_total)
 
     def normalize_text(self, text: str) -> str:
         """
@@ -123,19 +146,20 @@ class PDFComparator:
         """
         Ottiene le differenze dettagliate tra due testi
         """
-        matcher = SequenceMatcher(None, text1, text2)
-        differences = []
-
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag != 'equal':
-                diff_entry = {
-                    'operation': tag,  # 'replace', 'delete', 'insert'
-                    'text1': text1[i1:i2] if tag != 'insert' else '',
-                    'text2': text2[j1:j2] if tag != 'delete' else '',
-                    'position1': (i1, i2),
-                    'position2': (j1, j2)
-                }
-                differences.append(diff_entry)
+        with profiler.stage('diff'):
+            matcher = SequenceMatcher(None, text1, text2)
+            differences = []
+
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag != 'equal':
+                    diff_entry = {
+                        'operation': tag,  # 'replace', 'delete', 'insert'
+                        'text1': text1[i1:i2] if tag != 'insert' else '',
+                        'text2': text2[j1:j2] if tag != 'delete' else '',
+                        'position1': (i1, i2),
+                        'position2': (j1, j2)
+                    }
+                    differences.append(diff_entry)
 
         return differences
 
@@ -172,48 +196,148 @@ class PDFComparator:
 
         max_similarity = -1.0
         closest_index = None
-
-        # Itera sul vettore per trovare la stringa con il punteggio di similitudine più alto
-        for i, vector_string in enumerate(vs[j0:], start=j0):
-            # Utilizza SequenceMatcher per calcolare la similitudine
-            s2 = vector_string['normalized']
-            matcher = SequenceMatcher(None, s, s2)
-            similarity_ratio = matcher.ratio()
-
-            if similarity_ratio > max_similarity and similarity_ratio > self.similarity_threshold:
-                max_similarity = similarity_ratio
-                closest_index = i
-                break
-
+        calls = 0
+
+        with profiler.stage('ricerca_candidati'):
+            # Itera sul vettore per trovare la stringa con il punteggio di similitudine più alto
+            for i, vector_string in enumerate(vs[j0:], start=j0):
+                # Utilizza SequenceMatcher per calcolare la similitudine
+                s2 = vector_string['normalized']
+                matcher = SequenceMatcher(None, s, s2)
+                similarity_ratio = matcher.ratio()
+                calls += 1
+                if calls % CANCEL_CHECK_INTERVAL == 0:
+                    self.check_cancelled()
+
+                if similarity_ratio > max_similarity and similarity_ratio > self.similarity_threshold:
+                    max_similarity = similarity_ratio
+                    closest_index = i
+                    break
+
+        profiler.count('similarita', calls=calls)
         return closest_index, max_similarity
 
     def match_lines(self, pages_text1, pages_text2):
         #doc1 = self.get_lines(pages_text1)
         #doc2 = self.get_lines(pages_text2)
+        return list(self.iter_match_lines(pages_text1, pages_text2))
 
-        matches = []
+    def iter_match_lines(self, pages_text1, pages_text2, start1=0, start2=0):
+        """
+        Come match_lines, ma restituisce i match uno alla volta, in ordine di
+        riga del doc1, appena trovati. start1 e start2 vengono sommati agli
+        indici doc1 e doc2 (righe che fanno parte di liste più lunghe).
+        """
         j0 = 0
         for i, l in enumerate(pages_text1):
-            try:
-                j, score = self.find_closest_string(pages_text2, l['normalized'], j0)
-                if j is not None:
-                    matches.append({
-                        'doc1': i,
-                        'doc2': j,
-                        'score': score,
-                        'diff': self.get_detailed_differences(l['normalized'], pages_text2[j]['normalized'])
-                    }
-                    )
-                    if score > 0.93:
-                        j0 = j + 1
-                else:
-                    a = 0
-            except Exception as e:
-                b = 0
-            a1 = 0
+            # Gli errori arrivano al chiamante (il worker li mostra): una riga
+            # non deve sparire in silenzio dal risultato
+            j, score = self.find_closest_string(pages_text2, l['normalized'], j0)
+            self.line_done()
+            if j is not None:
+                if score > 0.93:
+                    j0 = j + 1
+                yield {
+                    'doc1': i + start1,
+                    'doc2': j + start2,
+                    'score': score,
+                    'diff': self.get_detailed_differences(l['normalized'], pages_text2[j]['normalized'])
+                }
+
+    def segment_fingerprints(self, lines: List[Dict]) -> List[Dict]:
+        """
+        Raggruppa le righe in paragrafi o versi con PDFTextSegmenter e calcola
+        per ogni segmento un'impronta economica: hash del testo normalizzato
+        e insieme delle parole
+        """
+        segmenter = PDFTextSegmenter()
+        segments = []
+        for segment in segmenter.segment_mixed(lines):
+            start, end = segment['blocks']
+            words = ' '.join(l['normalized'] for l in lines[start:end]).split()
+            segments.append({
+                'start': start,
+                'end': end,
+                'key': hash(' '.join(words)),
+                'words': frozenset(words)
+            })
+        return segments
+
+    def align_segments(self, segments1: List[Dict], segments2: List[Dict],
+                       window: int = 20, min_overlap: float = 0.5) -> List[Tuple[int, int]]:
+        """
+        Allinea i segmenti dei due documenti in ordine: prima per hash identico,
+        poi per sovrapposizione delle parole (Jaccard) entro una finestra
 
+        Returns:
+            Lista di coppie (indice_segmento1, indice_segmento2) crescenti
+        """
+        positions2 = {}
+        for j, segment in enumerate(segments2):
+            positions2.setdefault(segment['key'], []).append(j)
 
-        return matches
+        pairs = []
+        j0 = 0
+        for i, segment in enumerate(segments1):
+            # Match esatto: prima occorrenza non ancora superata, entro la finestra
+            best = None
+            for j in positions2.get(segment['key'], ()):
+                if j0 <= j < j0 + window:
+                    best = j
+                    break
+
+            if best is None:
+                words1 = segment['words']
+                best_score = min_overlap
+                for j in range(j0, min(j0 + window, len(segments2))):
+                    words2 = segments2[j]['words']
+                    # Limite superiore di Jaccard dato dalle dimensioni degli insiemi
+                    small, large = sorted((len(words1), len(words2)))
+                    if not large or small / large <= best_score:
+                        continue
+                    score = len(words1 & words2) / len(words1 | words2)
+                    if score > best_score:
+                        best, best_score = j, score
+
+            if best is not None:
+                pairs.append((i, best))
+                j0 = best + 1
+
+        return pairs
+
+    def match_hierarchical(self, pages_text1, pages_text2):
+        return list(self.iter_hierarchical(pages_text1, pages_text2))
+
+    def iter_hierarchical(self, pages_text1, pages_text2):
+        """
+        Confronto a due livelli: allinea prima i paragrafi/versi dei due documenti
+        e poi esegue il match riga per riga solo dentro le coppie di segmenti
+        allineate (e negli intervalli non allineati tra una coppia e l'altra)
+        """
+        with profiler.stage('allineamento_segmenti'):
+            segments1 = self.segment_fingerprints(pages_text1)
+            segments2 = self.segment_fingerprints(pages_text2)
+            pairs = self.align_segments(segments1, segments2)
+
+        # Intervalli di righe da confrontare, in ordine di documento
+        ranges = []
+        end1 = end2 = 0
+        for i, j in pairs:
+            start1 = max(segments1[i]['start'], end1)
+            start2 = max(segments2[j]['start'], end2)
+            if start1 > end1 or start2 > end2:
+                ranges.append((end1, start1, end2, start2))
+            end1 = max(segments1[i]['end'], start1)
+            end2 = max(segments2[j]['end'], start2)
+            ranges.append((start1, end1, start2, end2))
+        ranges.append((end1, len(pages_text1), end2, len(pages_text2)))
+
+        for start1, stop1, start2, stop2 in ranges:
+            self.check_cancelled()
+            if start1 >= stop1 or start2 >= stop2:
+                continue
+            yield from self.iter_match_lines(pages_text1[start1:stop1], pages_text2[start2:stop2],
+                                             start1, start2)
 
     def create_semantic_blocks(self, pages_text: List[str]) -> List[Dict]:
         """
@@ -501,6 +625,20 @@ class PDFComparator:
             return f"Documenti molto diversi ({similarity:.1f}% di similarità)"
 
 
+# Strategie di allineamento riga per riga disponibili: nome -> funzione(comparator, righe1, righe2)
+# Ogni strategia restituisce una lista di match {'doc1', 'doc2', 'score', 'diff'}
+ALIGNMENT_STRATEGIES = {
+    'lines': PDFComparator.match_lines,
+    'hierarchical': PDFComparator.match_hierarchical,
+}
+
+# Le stesse strategie in forma di iteratore: i match escono in ordine di riga del doc1
+MATCH_ITERATORS = {
+    'lines': PDFComparator.iter_match_lines,
+    'hierarchical': PDFComparator.iter_hierarchical,
+}
+
+
 # Funzioni di convenienza
 def extract_pdf_text(pdf_path: str) -> Tuple[List[str], bool]:
     """
@@ -514,7 +652,8 @@ def extract_pdf_text(pdf_path: str) -> Tuple[List[str], bool]:
 
 
 def compare_pdf_files(pdf_path1: str, pdf_path2: str,
-                      similarity_threshold: float = 0.7) -> Dict:
+                      similarity_threshold: float = 0.7, mode: str = 'lines',
+                      progress=None, cancel_event=None, on_lines=None) -> Dict:
     """
     Confronta due file PDF direttamente
 
@@ -522,34 +661,79 @@ def compare_pdf_files(pdf_path1: str, pdf_path2: str,
         pdf_path1: Percorso del primo PDF
         pdf_path2: Percorso del secondo PDF
         similarity_threshold: Soglia di similarità (0-1)
+        mode: Strategia di allineamento (vedi ALIGNMENT_STRATEGIES): 'lines' confronta
+              riga per riga, 'hierarchical' allinea prima paragrafi/versi
+        progress, cancel_event, on_lines: vedi iter_matches
 
     Returns:
-        Dizionario con risultati del confronto
+        (risultato, righe del documento 1, righe del documento 2): nel risultato
+        doc1 e doc2 sono indici nelle rispettive liste di righe, che contengono
+        tutte le righe estratte, comprese quelle senza corrispondenza
+    """
+    lines = []
+
+    def keep_lines(lines1, lines2):
+        lines.extend((lines1, lines2))
+        if on_lines is not None:
+            on_lines(lines1, lines2)
+
+    result = list(iter_matches(pdf_path1, pdf_path2, similarity_threshold, mode,
+                               progress=progress, cancel_event=cancel_event, on_lines=keep_lines))
+    return result, lines[0], lines[1]
+
+
+def iter_matches(pdf_path1: str, pdf_path2: str,
+                 similarity_threshold: float = 0.7, mode: str = 'lines',
+                 progress=None, cancel_event=None, on_lines=None) -> Iterator[Dict]:
+    """
+    Confronta due file PDF restituendo i match uno alla volta, in ordine di
+    riga del doc1, appena vengono trovati: chi li consuma può mostrarli
+    subito senza attendere la fine del confronto né tenerne una copia.
+
+    Args:
+        pdf_path1, pdf_path2, similarity_threshold, mode: vedi compare_pdf_files
+        progress: Chiamata come progress(stadio, fatti, totale); gli stadi sono
+                  'estrazione1', 'estrazione2' (pagine) e 'confronto' (righe del doc1)
+        cancel_event: threading.Event controllato tra uno stadio e l'altro e durante
+                      ogni stadio; se impostato solleva ComparisonCancelled
+        on_lines: Chiamata come on_lines(righe1, righe2) appena il testo è estratto,
+                  prima del primo match: doc1 e doc2 dei match sono indici in queste liste
+
+    Yields:
+        Match {'doc1', 'doc2', 'score', 'diff'}
     """
 
     from pdf_processor import extract_text_lines_from_pdf, normalize_blocks, remove_notes
-    pages_text1a = extract_text_lines_from_pdf(pdf_path1)
+    comparator = PDFComparator(similarity_threshold, progress=progress, cancel_event=cancel_event)
+
+    def page_progress(stage):
+        def callback(done, total):
+            comparator.report(stage, done, total)
+            return cancel_event is not None and cancel_event.is_set()
+        return callback
+
+    pages_text1a = extract_text_lines_from_pdf(pdf_path1, progress=page_progress('estrazione1'))
+    comparator.check_cancelled()
     pages_text1b = remove_notes(pages_text1a)
     pages_text1c = normalize_blocks(pages_text1b)
 
-    pages_text2a = extract_text_lines_from_pdf(pdf_path2)
+    pages_text2a = extract_text_lines_from_pdf(pdf_path2, progress=page_progress('estrazione2'))
+    comparator.check_cancelled()
     pages_text2b = remove_notes(pages_text2a)
     pages_text2c = normalize_blocks(pages_text2b)
 
+    if on_lines is not None:
+        on_lines(pages_text1c, pages_text2c)
+
     # Estrai testo da entrambi i PDF
     #segmenter = PDFTextSegmenter()
     #pages_text1 = segmenter.process_pdf(pdf_path1, 'poetry')
     #pages_text2 = segmenter.process_pdf(pdf_path2, 'poetry')
 
     # Confronta
-    comparator = PDFComparator(similarity_threshold)
-    result = comparator.match_lines(pages_text1c, pages_text2c)
-    pages_text1d = [pages_text1c[r['doc1']] for r in result]
-    pages_text2d = [pages_text2c[r['doc2']] for r in result]
-    for i, r in enumerate(result):
-        r['doc1'] = i
-        r['doc2'] = i
-    return result, pages_text1d, pages_text2d
+    comparator.lines_total = len(pages_text1c)
+    yield from MATCH_ITERATORS[mode](comparator, pages_text1c, pages_text2c)
+    comparator.report('confronto', comparator.lines_total, comparator.lines_total)
 
 
 def compare_pdf_texts(pages_text1: List[str], pages_text2: List[str],
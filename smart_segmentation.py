@@ -1,10 +1,27 @@
-import fitz  # PyMuPDF
 import re
-from typing import List, Dict, Tuple
+from bisect import bisect_right
+from typing import List, Dict, Tuple, Iterator
 from collections import Counter
 import json
 import numpy as np
 
+from page_analysis import use_document
+
+# Pattern precompilati usati dalla segmentazione
+PARAGRAPH_BREAK_RE = re.compile(r'\n\s*\n')
+WHITESPACE_RE = re.compile(r'\s+')
+SENTENCE_END_RE = re.compile(r'[.!?]+')
+LINE_END_PUNCT_RE = re.compile(r'[.!?;,]$')
+NON_WORD_RE = re.compile(r'[^\w]')
+
+# Classificazione prosa/poesia: righe usate per le rime e righe minime per pagina
+RHYME_SAMPLE_LINES = 20
+MIN_CLASSIFY_LINES = 8
+
+# Oltre questa lunghezza un paragrafo in prosa viene spezzato in blocchi di frasi
+PROSE_MAX_LENGTH = 1000
+PROSE_CHUNK_LENGTH = 800
+
 class PDFTextSegmenter:
     def __init__(self):
         self.segments = []
@@ -18,22 +35,48 @@ class PDFTextSegmenter:
         """
         if not text_blocks:
             return "prose"
+        return self.classify_features([self.block_features(block) for block in text_blocks])
 
-        lines = []
-        for block in text_blocks:
-            block_lines = block['text'].strip().split('\n')
-            lines.extend([line.strip() for line in block_lines if line.strip()])
-
-        if not lines:
+    def block_features(self, block: Dict) -> Dict:
+        """
+        Calcola (una sola volta) le metriche di un blocco usate per la
+        classificazione prosa/poesia e le memorizza nel blocco stesso
+        """
+        features = block.get('features')
+        if features is not None:
+            return features
+
+        lines = [line.strip() for line in block['text'].strip().split('\n') if line.strip()]
+
+        # Terminazioni delle prime righe, per la ricerca di rime (None se la parola è troppo corta)
+        endings = []
+        for line in lines[:RHYME_SAMPLE_LINES]:
+            last_word = NON_WORD_RE.sub('', line.split()[-1]).lower()
+            endings.append(last_word[-2:] if len(last_word) >= 3 else None)
+
+        features = {
+            'lines': len(lines),
+            'total_length': sum(len(line) for line in lines),
+            'short_lines': sum(1 for line in lines if len(line) < 50),
+            'long_lines': sum(1 for line in lines if len(line) > 80),
+            'no_punct_lines': sum(1 for line in lines if not LINE_END_PUNCT_RE.search(line)),
+            'endings': endings
+        }
+        block['features'] = features
+        return features
+
+    def classify_features(self, features_list: List[Dict]) -> str:
+        """Classifica come prosa o poesia un insieme di blocchi a partire dalle loro metriche"""
+        n_lines = sum(f['lines'] for f in features_list)
+        if not n_lines:
             return "prose"
 
         # Calcola metriche
-        line_lengths = [len(line) for line in lines]
-        avg_length = sum(line_lengths) / len(line_lengths)
+        avg_length = sum(f['total_length'] for f in features_list) / n_lines
 
         # Conta righe corte vs lunghe
-        short_lines = sum(1 for length in line_lengths if length < 50)
-        long_lines = sum(1 for length in line_lengths if length > 80)
+        short_lines = sum(f['short_lines'] for f in features_list)
+        long_lines = sum(f['long_lines'] for f in features_list)
 
         # Score per poesia
         poetry_score = 0
@@ -52,28 +95,102 @@ class PDFTextSegmenter:
             prose_score += 1
 
         # Verifica pattern di fine riga (poesia spesso non finisce con punteggiatura)
-        lines_without_punct = sum(1 for line in lines if not re.search(r'[.!?;,]$', line))
-        if lines_without_punct > len(lines) * 0.3:
+        lines_without_punct = sum(f['no_punct_lines'] for f in features_list)
+        if lines_without_punct > n_lines * 0.3:
             poetry_score += 1
 
-        # Verifica presenza di possibili rime (semplificato)
-        word_endings = []
-        for line in lines[:20]:  # Controlla solo le prime 20 righe per performance
-            words = line.split()
-            if words:
-                last_word = re.sub(r'[^\w]', '', words[-1]).lower()
-                if len(last_word) >= 3:
-                    word_endings.append(last_word[-2:])  # Ultime 2 lettere
+        # Verifica presenza di possibili rime (semplificato), solo sulle prime righe
+        sample = []
+        for f in features_list:
+            sample.extend(f['endings'][:RHYME_SAMPLE_LINES - len(sample)])
+            if len(sample) >= RHYME_SAMPLE_LINES:
+                break
+        word_endings = [e for e in sample if e is not None]
 
         if word_endings:
             ending_counts = Counter(word_endings)
             # Se ci sono terminazioni ripetute, potrebbe essere poesia
             repeated_endings = sum(1 for count in ending_counts.values() if count > 1)
-            if repeated_endings > len(set(word_endings)) * 0.3:
+            if repeated_endings > len(ending_counts) * 0.3:
                 poetry_score += 1
 
         return "poetry" if poetry_score > prose_score else "prose"
 
+    def classify_pages(self, text_blocks: List[Dict]) -> Dict[int, str]:
+        """
+        Classifica ogni pagina come prosa o poesia.
+
+        Le metriche dei blocchi restano memorizzate nei blocchi, quindi una nuova
+        classificazione costa solo l'aggregazione. Le pagine con poche righe non
+        sono affidabili e prendono il tipo della pagina precedente (o della
+        successiva se all'inizio del documento).
+        """
+        page_features = {}
+        for block in text_blocks:
+            page_features.setdefault(block['page'], []).append(self.block_features(block))
+
+        page_types = {}
+        uncertain = []
+        for page, features_list in page_features.items():
+            if sum(f['lines'] for f in features_list) < MIN_CLASSIFY_LINES:
+                uncertain.append(page)
+            else:
+                page_types[page] = self.classify_features(features_list)
+
+        if not page_types:
+            # Nessuna pagina abbastanza lunga: classifica il documento intero
+            label = self.classify_features([f for fl in page_features.values() for f in fl])
+            return {page: label for page in page_features}
+
+        pages = sorted(page_features)
+        last = None
+        for page in pages:
+            if page in page_types:
+                last = page_types[page]
+            elif last is not None:
+                page_types[page] = last
+        first = next(page_types[p] for p in pages if p in page_types)
+        for page in pages:
+            page_types.setdefault(page, first)
+
+        return page_types
+
+    def segment_mixed(self, text_blocks: List[Dict]) -> List[Dict]:
+        """
+        Segmenta un documento che alterna prosa e poesia: le pagine consecutive
+        dello stesso tipo formano una regione segmentata con il metodo adatto
+        """
+        page_types = self.classify_pages(text_blocks)
+
+        segments = []
+        region_start = 0
+        region_type = None
+        for i, block in enumerate(text_blocks):
+            block_type = page_types[block['page']]
+            if i > region_start and block_type != region_type:
+                segments.extend(self._segment_region(text_blocks, region_start, i, region_type))
+                region_start = i
+            region_type = block_type
+        if len(text_blocks) > region_start:
+            segments.extend(self._segment_region(text_blocks, region_start, len(text_blocks), region_type))
+
+        # Rinumera i segmenti in modo progressivo sull'intero documento
+        for segment_id, segment in enumerate(segments, start=1):
+            segment['id'] = segment_id
+        return segments
+
+    def _segment_region(self, text_blocks: List[Dict], start: int, end: int, text_type: str) -> List[Dict]:
+        region = text_blocks[start:end]
+        if text_type == "poetry":
+            segments = self.segment_poetry(region)
+        else:
+            segments = self.segment_prose(region)
+        # Riporta gli intervalli dei blocchi agli indici del documento completo
+        for segment in segments:
+            first, last = segment['blocks']
+            segment['blocks'] = (first + start, last + start)
+        return segments
+
     def merge_bboxes(self, bboxes: List[Tuple[float, float, float, float]]) -> Tuple[float, float, float, float]:
         """Unisce multiple bounding boxes in una singola"""
         if not bboxes:
@@ -102,7 +219,7 @@ class PDFTextSegmenter:
         segments = []
         segment_id = 1
 
-        for block in text_blocks:
+        for block_index, block in enumerate(text_blocks):
             lines = [block['text'].replace('\n', ' ')]
             #lines = block['text'].strip().split('\n')
             page_num = block['page']
@@ -122,7 +239,8 @@ class PDFTextSegmenter:
                             'original': current_verse,
                             'type': 'verse',
                             'page': page_num,
-                            'bbox': self.merge_bboxes(current_bboxes)
+                            'bbox': self.merge_bboxes(current_bboxes),
+                            'blocks': (block_index, block_index + 1)
                         })
                         segment_id += 1
                         current_verse = ""
@@ -139,7 +257,8 @@ class PDFTextSegmenter:
                             'original': current_verse,
                             'type': 'verse',
                             'page': page_num,
-                            'bbox': self.merge_bboxes(current_bboxes)
+                            'bbox': self.merge_bboxes(current_bboxes),
+                            'blocks': (block_index, block_index + 1)
                         })
                         segment_id += 1
 
@@ -159,7 +278,8 @@ class PDFTextSegmenter:
                     'original': current_verse,
                     'type': 'verse',
                     'page': page_num,
-                    'bbox': self.merge_bboxes(current_bboxes)
+                    'bbox': self.merge_bboxes(current_bboxes),
+                    'blocks': (block_index, block_index + 1)
                 })
                 segment_id += 1
 
@@ -167,110 +287,141 @@ class PDFTextSegmenter:
 
     def segment_prose(self, text_blocks: List[Dict]) -> List[Dict]:
         """Segmenta il testo in prosa per paragrafi"""
-        segments = []
+        return list(self.iter_prose_segments(text_blocks))
+
+    def iter_prose_segments(self, text_blocks: List[Dict]) -> Iterator[Dict]:
+        """
+        Segmenta il testo in prosa per paragrafi restituendo i segmenti man mano.
+
+        Il paragrafo corrente è tenuto come lista di parti (unite solo quando
+        serve il testo completo) e i paragrafi troppo lunghi vengono spezzati
+        in un'unica passata: il costo è lineare nella lunghezza del testo.
+        Ogni segmento riporta in 'blocks' l'intervallo [inizio, fine) dei
+        blocchi di input da cui proviene.
+        """
         segment_id = 1
 
-        current_paragraph = ""
-        current_bboxes = []
+        parts = []          # parti del paragrafo corrente
+        marks = []          # (offset nel testo unito, indice blocco) per ogni parte
+        length = 0          # lunghezza di ' '.join(parts)
+        bbox = None
         current_page = None
 
-        for block in text_blocks:
-            block_text = block['text']#.strip()
+        for block_index, block in enumerate(text_blocks):
+            block_text = block['text']
             if not block_text:
                 continue
 
             page_num = block['page']
 
             # Se cambia pagina e abbiamo testo accumulato, chiudi il paragrafo
-
-            if current_page is not None and current_page != page_num and current_paragraph:
-                segments.append({
-                    'id': segment_id,
-                    'text': current_paragraph.strip(),
-                    'type': 'paragraph',
-                    'page': current_page,
-                    'bbox': self.merge_bboxes(current_bboxes)
-                })
+            if current_page is not None and current_page != page_num and parts:
+                yield self._prose_segment(segment_id, ' '.join(parts), current_page, bbox,
+                                          (marks[0][1], marks[-1][1] + 1))
                 segment_id += 1
-                current_paragraph = ""
-                current_bboxes = []
-
+                parts, marks, length, bbox = [], [], 0, None
 
             current_page = page_num
 
             # Dividi il blocco in possibili paragrafi
-            paragraphs = re.split(r'\n\s*\n', block_text)
-
-            for para in paragraphs:
-                para = para.strip()
+            for para in PARAGRAPH_BREAK_RE.split(block_text):
+                # Pulisci il paragrafo (a capo e spazi multipli diventano un solo spazio)
+                para = WHITESPACE_RE.sub(' ', para).strip()
                 if not para:
                     continue
 
-                # Pulisci il paragrafo (rimuovi a capo singoli, mantieni spazi)
-                para = re.sub(r'\n+', ' ', para)
-                para = re.sub(r'\s+', ' ', para)
+                if parts and parts[-1][-1] in '.!?':
+                    # Il paragrafo precedente finisce con punteggiatura forte: chiudilo
+                    yield self._prose_segment(segment_id, ' '.join(parts), current_page, bbox,
+                                              (marks[0][1], marks[-1][1] + 1))
+                    segment_id += 1
+                    parts, marks, length, bbox = [], [], 0, None
 
-                if current_paragraph:
-                    # Se abbiamo già un paragrafo in corso, decidere se continuare o chiudere
-                    # Controlla se finisce con punteggiatura forte
-                    if re.search(r'[.!?]\s*$', current_paragraph):
-                        # Chiudi il paragrafo precedente
-                        segments.append({
-                            'id': segment_id,
-                            'text': current_paragraph.strip(),
-                            'type': 'paragraph',
-                            'page': current_page,
-                            'bbox': self.merge_bboxes(current_bboxes)
-                        })
-                        segment_id += 1
-                        current_paragraph = para
-                        current_bboxes = [block['bbox']]
-                    else:
-                        # Continua il paragrafo
-                        current_paragraph += " " + para
-                        current_bboxes.append(block['bbox'])
-                else:
+                if not parts:
                     # Inizia nuovo paragrafo
-                    current_paragraph = para
-                    current_bboxes = [block['bbox']]
+                    parts, marks = [para], [(0, block_index)]
+                    length, bbox = len(para), tuple(block['bbox'])
+                else:
+                    # Continua il paragrafo
+                    parts.append(para)
+                    marks.append((length + 1, block_index))
+                    length += len(para) + 1
+                    bbox = self.merge_bbox(bbox, block['bbox'])
+
+                # Se il paragrafo diventa troppo lungo, spezzalo per frasi
+                if length > PROSE_MAX_LENGTH:
+                    text = ' '.join(parts)
+                    offsets = [m[0] for m in marks]
+                    spans, rest_start = self.split_long_paragraph(text)
+                    for start, end in spans:
+                        first = marks[bisect_right(offsets, start) - 1][1]
+                        last = marks[bisect_right(offsets, end - 1) - 1][1]
+                        yield self._prose_segment(segment_id, text[start:end], current_page, bbox,
+                                                  (first, last + 1))
+                        segment_id += 1
 
-                # Se il paragrafo diventa troppo lungo, spezzalo
-                if len(current_paragraph) > 1000:
-                    sentences = re.split(r'([.!?]+)', current_paragraph)
-                    temp_para = ""
-
-                    for i in range(0, len(sentences), 2):
-                        if i + 1 < len(sentences):
-                            sentence = sentences[i] + sentences[i + 1]
-                        else:
-                            sentence = sentences[i]
-
-                        if len(temp_para + sentence) > 800 and temp_para:
-                            segments.append({
-                                'id': segment_id,
-                                'text': temp_para.strip(),
-                                'type': 'paragraph',
-                                'page': current_page,
-                                'bbox': self.merge_bboxes(current_bboxes)
-                            })
-                            segment_id += 1
-                            temp_para = sentence
-                        else:
-                            temp_para += sentence
-
-                    current_paragraph = temp_para
+                    rest = text[rest_start:]
+                    rest_start += len(rest) - len(rest.lstrip())
+                    rest = rest.strip()
+                    # Parti che coprono il testo residuo, con offset riportati all'inizio del residuo
+                    marks = [(max(0, offset - rest_start), index)
+                             for offset, index in marks[bisect_right(offsets, rest_start) - 1:]]
+
+                    if len(rest) > PROSE_MAX_LENGTH:
+                        # Una sola frase senza punteggiatura: chiudila subito invece
+                        # di rianalizzarla a ogni nuova parte
+                        yield self._prose_segment(segment_id, rest, current_page, bbox,
+                                                  (marks[0][1], marks[-1][1] + 1))
+                        segment_id += 1
+                        rest = ''
+
+                    if rest:
+                        parts, length = [rest], len(rest)
+                        marks = [(0, marks[0][1])] + marks[1:]
+                    else:
+                        parts, marks, length, bbox = [], [], 0, None
 
         # Chiudi l'ultimo paragrafo se presente
-        if current_paragraph:
-            segments.append({
-                'id': segment_id,
-                'text': current_paragraph.strip(),
-                'type': 'paragraph',
-                'page': current_page,
-                'bbox': self.merge_bboxes(current_bboxes)
-            })
+        if parts:
+            yield self._prose_segment(segment_id, ' '.join(parts), current_page, bbox,
+                                      (marks[0][1], marks[-1][1] + 1))
 
-        return segments
+    def split_long_paragraph(self, text: str,
+                             chunk_length: int = PROSE_CHUNK_LENGTH) -> Tuple[List[Tuple[int, int]], int]:
+        """
+        Spezza un paragrafo in blocchi di frasi lunghi al più chunk_length caratteri
+        (salvo frasi singole più lunghe), in un'unica passata sul testo.
+
+        Returns:
+            (intervalli (inizio, fine) dei blocchi completi, inizio del testo residuo)
+        """
+        spans = []
+        chunk_start = 0
+        pos = 0
+
+        ends = [m.end() for m in SENTENCE_END_RE.finditer(text)]
+        if not ends or ends[-1] < len(text):
+            ends.append(len(text))
+
+        for end in ends:
+            # La frase corrente è text[pos:end]
+            if end - chunk_start > chunk_length and pos > chunk_start:
+                if text[chunk_start:pos].strip():
+                    spans.append((chunk_start, pos))
+                chunk_start = pos
+            pos = end
+
+        return spans, chunk_start
+
+    def _prose_segment(self, segment_id: int, text: str, page, bbox, blocks: Tuple[int, int]) -> Dict:
+        return {
+            'id': segment_id,
+            'text': text.strip(),
+            'type': 'paragraph',
+            'page': page,
+            'bbox': bbox if bbox is not None else (0, 0, 0, 0),
+            'blocks': blocks
+        }
 
     def merge_bbox(self, bbox, boxs):
         bb = ( min(bbox[0], boxs[0]),
@@ -283,18 +434,13 @@ class PDFTextSegmenter:
         #import pymupdf4llm
         #md_text = pymupdf4llm.to_markdown(pdf_path)
         """Estrae blocchi di testo dal PDF con metadati"""
-        doc = fitz.open(pdf_path)
-        text_blocks = []
+        with use_document(pdf_path) as doc:
+            text_blocks = []
 
-        for page_num in range(doc.page_count):
-            page = doc[page_num]
-
-            # Estrai blocchi di testo con posizione
-            blocks = page.get_text("dict")
-            #blocks1 = page.get_text("blocks")
-
-            for block in blocks["blocks"]:
-                if block.get("type") == 0:  # Blocco di testo
+            for page in doc.pages():
+                page_num = page.number
+                # Blocchi di testo con posizione, dall'analisi condivisa della pagina
+                for block in page.text_blocks():
                     block_text = ""
                     block_bbox1 = block["bbox"]
 
@@ -328,7 +474,6 @@ class PDFTextSegmenter:
                             'page': page_num + 1  # Numerazione pagine da 1
                         })
 
-        doc.close()
         return text_blocks
         v = []
         current = -1
@@ -413,18 +558,24 @@ class PDFTextSegmenter:
             print("Nessun testo trovato nel PDF")
             return []
 
-        # Rileva il tipo di testo
+        # Senza tipo esplicito ogni pagina viene classificata separatamente
         text_type = type
-        if text_type == None:
-            text_type = self.detect_text_type(text_blocks)
-            print(f"Tipo di testo rilevato: {'Poesia' if text_type == 'poetry' else 'Prosa'}")
+        if text_type is None:
+            page_types = self.classify_pages(text_blocks)
+            n_poetry = sum(1 for t in page_types.values() if t == 'poetry')
+            print(f"Tipo di testo rilevato: {n_poetry} pagine di poesia, "
+                  f"{len(page_types) - n_poetry} pagine di prosa")
+            text_type = 'mixed'
 
-        return self.process_txt(text_blocks, type)
+        return self.process_txt(text_blocks, text_type)
 
     def process_txt(self, text_blocks: List[Dict], text_type) -> List[Dict]:
 
         # Segmenta in base al tipo
-        if text_type == "poetry":
+        if text_type in (None, "mixed"):
+            self.segments = self.segment_mixed(text_blocks)
+            print(f"Segmentazione completata: {len(self.segments)} segmenti")
+        elif text_type == "poetry":
             self.segments = self.segment_poetry(text_blocks)
             print(f"Segmentazione completata: {len(self.segments)} versi")
         else:
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compare_index import LineSpatialIndex, map_index
+
+
+def test_map_index_plain_text():
+    # 'Ciao, mondo' -> 'ciao mondo': la 'm' (indice 5) è in posizione 6
+    assert map_index('Ciao, mondo', 'ciao mondo', 5) == 6
+
+
+def test_map_index_nbsp():
+    original = 'distanza 10\xa0km'
+    norm = 'distanza 10 km'
+    assert map_index(original, norm, norm.index('km')) == original.index('km')
+    assert map_index(original, norm, len(norm)) == len(original)
+
+
+def test_map_index_tab():
+    assert map_index('a\tb', 'a b', 2) == 2
+    assert map_index('a\tb', 'a b', 3) == 3
+
+
+def test_map_index_clamped():
+    # Indici oltre la fine o testi che non corrispondono non escono dall'originale
+    assert map_index('abc', 'abc', 10) == 3
+    assert map_index('abc', 'xyz', 2) == 3
+
+
+def line(page, x0, y0, x1, y1):
+    return {'page': page, 'bbox': (x0, y0, x1, y1)}
+
+
+def test_line_spatial_index_columns():
+    index = LineSpatialIndex([
+        line(1, 0, 0, 100, 10), line(1, 200, 0, 300, 10),
+        line(1, 0, 12, 100, 22), line(2, 0, 0, 100, 10),
+    ])
+    assert index.find(1, 50, 5) == 0
+    assert index.find(1, 250, 5) == 1
+    assert index.find(1, 150, 16) == 2  # fuori dalla riga ma alla sua altezza
+    assert index.find(1, 50, 11) == -1  # tra due righe
+    assert index.find(1, 50, 10) == 0  # sul bordo
+    assert index.find(2, 50, 5) == 3
+    assert index.find(3, 50, 5) == -1
+
+
+def test_line_spatial_index_tall_line():
+    # Una riga molto alta non nasconde quelle brevi che si trovano sotto di lei
+    lines = [line(1, 0, 0, 20, 1000)]
+    lines += [line(1, 100, y, 200, y + 8) for y in range(0, 1000, 10)]
+    index = LineSpatialIndex(lines)
+    assert index.find(1, 10, 995) == 0
+    assert index.find(1, 150, 995) == 100
+    assert index.find(1, 150, 509) == 0  # tra due righe brevi resta quella alta
@@ -0,0 +1,318 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from PyQt6.QtCore import QPoint, QRunnable, QSize, pyqtSignal
+from PyQt6.QtGui import QColor, QIcon, QImage, QPainter, QPixmap
+from PyQt6.QtWidgets import QListView, QListWidget, QListWidgetItem
+
+from page_render import (BackgroundRenderer, PageRenderCache, document_key, render_page_image,
+                         thread_document)
+
+# Zoom delle miniature (circa 14 dpi: una pagina A4 è larga ~120 pixel)
+THUMBNAIL_ZOOM = 0.2
+THUMBNAIL_ICON_SIZE = QSize(120, 170)
+
+# Budget della cache in memoria delle miniature
+THUMBNAIL_CACHE_MB = 64
+
+# Spazio massimo occupato dalla cache su disco: oltre si eliminano le miniature usate meno di recente
+THUMBNAIL_DISK_CACHE_MB = 200
+
+# Cartella della cache su disco
+CACHE_DIR = os.environ.get('PDFCOMPARE_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'pdfcompare'))
+
+# Priorità delle miniature visibili rispetto alle altre
+VISIBLE_PRIORITY = 10
+
+# Thread dedicati al rendering delle miniature
+THUMBNAIL_THREADS = 2
+
+# Righe considerate visibili se la lista non è ancora stata disposta
+DEFAULT_VISIBLE_ROWS = 10
+
+_digests = {}  # (percorso, mtime, dimensione) -> sha1
+_digest_locks = {}  # (percorso, mtime, dimensione) -> lock del calcolo in corso
+_digests_lock = threading.Lock()
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    SHA-1 del contenuto del file, calcolato una sola volta per ogni versione
+    del file. Legge tutto il file: va chiamata fuori dal thread della GUI.
+    """
+    key = document_key(path)
+    with _digests_lock:
+        digest = _digests.get(key)
+        if digest is not None:
+            return digest
+        lock = _digest_locks.setdefault(key, threading.Lock())
+
+    # Più job dello stesso documento attendono un solo calcolo
+    with lock:
+        with _digests_lock:
+            digest = _digests.get(key)
+        if digest is None:
+            try:
+                sha = hashlib.sha1()
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(chunk_size), b''):
+                        sha.update(chunk)
+                digest = sha.hexdigest()
+                with _digests_lock:
+                    _digests[key] = digest
+            finally:
+                # Anche se la lettura fallisce il lock non deve restare nel dizionario
+                with _digests_lock:
+                    _digest_locks.pop(key, None)
+    return digest
+
+
+class ThumbnailDiskCache:
+    """Miniature salvate come PNG, in una cartella per documento (hash del contenuto)"""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.path.join(CACHE_DIR, 'miniature')
+
+    def path(self, digest, page_num, zoom) -> str:
+        return os.path.join(self.directory, digest, f"{page_num}_{round(zoom * 1000)}.png")
+
+    def load(self, digest, page_num, zoom):
+        """Restituisce la miniatura salvata o None"""
+        path = self.path(digest, page_num, zoom)
+        if not os.path.exists(path):
+            return None
+        image = QImage(path)
+        if image.isNull():
+            return None
+        try:
+            os.utime(path)  # la data di modifica fa da data di ultimo uso per prune
+        except OSError:
+            pass
+        return image
+
+    def save(self, digest, page_num, zoom, image: QImage):
+        path = self.path(digest, page_num, zoom)
+        try:
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # Scrittura atomica su un file temporaneo univoco: due job della
+            # stessa miniatura non si sovrascrivono e un file a metà non viene letto
+            with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as tmp:
+                tmp_path = tmp.name
+            if image.save(tmp_path, 'PNG'):
+                os.replace(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+        except OSError as e:
+            print(f"Errore nel salvataggio della miniatura: {e}")
+
+    def prune(self, max_bytes: int = THUMBNAIL_DISK_CACHE_MB * 1024 * 1024):
+        """Elimina le miniature usate meno di recente finché la cache supera max_bytes"""
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= max_bytes:
+            return
+
+        files.sort()
+        for _, size, path in files:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            try:
+                os.rmdir(os.path.dirname(path))  # solo se la cartella è rimasta vuota
+            except OSError:
+                pass
+
+
+class PruneJob(QRunnable):
+    """Pulizia della cache su disco, in background"""
+
+    def __init__(self, disk_cache):
+        super().__init__()
+        self.disk_cache = disk_cache
+
+    def run(self):
+        try:
+            self.disk_cache.prune()
+        except Exception as e:
+            print(f"Errore nella pulizia della cache delle miniature: {e}")
+
+
+class ThumbnailJob(QRunnable):
+    """Carica la miniatura dal disco o, se manca, la renderizza e la salva"""
+
+    def __init__(self, renderer, key, path, page_num, zoom):
+        super().__init__()
+        self.setAutoDelete(False)  # il riferimento è tenuto dal renderer
+        self.renderer = renderer
+        self.key = key
+        self.path = path
+        self.page_num = page_num
+        self.zoom = zoom
+
+    def run(self):
+        disk_cache = self.renderer.disk_cache
+        try:
+            # L'hash del file si calcola qui, fuori dal thread della GUI
+            digest = file_digest(self.path)
+            image = disk_cache.load(digest, self.page_num, self.zoom)
+            if image is None:
+                with thread_document(self.path) as doc:
+                    image = render_page_image(doc[self.page_num], self.zoom)
+                disk_cache.save(digest, self.page_num, self.zoom, image)
+        except Exception as e:
+            print(f"Errore nella miniatura della pagina {self.page_num}: {e}")
+            image = None
+        self.renderer.job_finished.emit(self.key, image)
+
+
+class ThumbnailRenderer(BackgroundRenderer):
+    """Renderer in background delle miniature, con cache su disco"""
+
+    def __init__(self, disk_cache: ThumbnailDiskCache = None, parent=None):
+        super().__init__(PageRenderCache(THUMBNAIL_CACHE_MB), max_threads=THUMBNAIL_THREADS,
+                         parent=parent)
+        self.disk_cache = disk_cache or ThumbnailDiskCache()
+        # Una pulizia della cache su disco per sessione, alla creazione del renderer
+        self.pool.start(PruneJob(self.disk_cache))
+
+    def make_job(self, key, path, page_num, zoom, dpr, clip):
+        return ThumbnailJob(self, key, path, page_num, zoom)
+
+
+class ThumbnailStrip(QListWidget):
+    page_selected = pyqtSignal(int)
+    """
+    Colonna di miniature delle pagine. Le miniature sono renderizzate in
+    background (prima quelle visibili) e colorate in base al numero di
+    differenze della pagina.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setFlow(QListView.Flow.TopToBottom)
+        self.setWrapping(False)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setIconSize(THUMBNAIL_ICON_SIZE)
+        self.setFixedWidth(THUMBNAIL_ICON_SIZE.width() + 40)
+
+        self.path = None
+        self.doc_key = None  # (percorso, mtime, dimensione): l'hash lo calcolano i job
+        self.loaded = set()  # pagine con la miniatura già impostata
+        self.difference_counts = {}  # pagina -> numero di differenze
+
+        self.renderer = ThumbnailRenderer(parent=self)
+        self.renderer.page_rendered.connect(self.on_thumbnail_rendered)
+        self.verticalScrollBar().valueChanged.connect(self.schedule_visible)
+        self.itemClicked.connect(lambda item: self.page_selected.emit(self.row(item)))
+
+    def set_document(self, path, n_pages):
+        """Mostra le miniature del documento (path None per svuotare)"""
+        self.renderer.cancel_pending()
+        self.clear()
+        self.loaded.clear()
+        self.path = path
+        self.doc_key = document_key(path) if path else None
+        if path is None:
+            self.difference_counts = {}
+            return
+
+        for page_num in range(n_pages):
+            item = QListWidgetItem(self)
+            item.setSizeHint(THUMBNAIL_ICON_SIZE + QSize(10, 25))
+            self.update_item_text(page_num)
+
+        # Tutte le miniature in coda a bassa priorità, poi quelle visibili in testa
+        for page_num in range(n_pages):
+            self.request(page_num)
+        self.schedule_visible()
+
+    def thumbnail_key(self, page_num):
+        return self.doc_key, page_num, THUMBNAIL_ZOOM
+
+    def request(self, page_num, priority=0):
+        self.renderer.request(self.thumbnail_key(page_num), self.path, page_num,
+                              THUMBNAIL_ZOOM, priority=priority)
+
+    def visible_rows(self):
+        """Prima e ultima riga visibili"""
+        viewport = self.viewport()
+        first = self.indexAt(QPoint(5, 5)).row()
+        last = self.indexAt(QPoint(5, viewport.height() - 5)).row()
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = min(self.count(), first + DEFAULT_VISIBLE_ROWS) - 1
+        return first, last
+
+    def schedule_visible(self):
+        """Anticipa il rendering delle miniature visibili non ancora caricate"""
+        if self.path is None or not self.count():
+            return
+        first, last = self.visible_rows()
+        for page_num in range(first, last + 1):
+            if page_num not in self.loaded:
+                self.renderer.cancel(self.thumbnail_key(page_num))
+                self.request(page_num, VISIBLE_PRIORITY)
+
+    def on_thumbnail_rendered(self, key, image):
+        if key[0] != self.doc_key or key[1] >= self.count():
+            return
+        page_num = key[1]
+        self.item(page_num).setIcon(self.make_icon(image, self.difference_counts.get(page_num, 0)))
+        self.loaded.add(page_num)
+
+    def make_icon(self, image, count):
+        """Miniatura colorata in rosso, tanto più intenso quante più differenze ha la pagina"""
+        pixmap = QPixmap.fromImage(image)
+        if count:
+            painter = QPainter(pixmap)
+            painter.fillRect(pixmap.rect(), QColor(255, 0, 0, min(30 + 15 * count, 150)))
+            painter.end()
+        return QIcon(pixmap)
+
+    def update_item_text(self, page_num):
+        count = self.difference_counts.get(page_num, 0)
+        text = f"{page_num + 1}" if not count else f"{page_num + 1} ({count} diff.)"
+        self.item(page_num).setText(text)
+
+    def set_difference_counts(self, counts):
+        """Imposta il numero di differenze per pagina (0-based) e aggiorna le miniature"""
+        changed = set(self.difference_counts) | set(counts)
+        self.difference_counts = dict(counts)
+        for page_num in changed:
+            if page_num >= self.count():
+                continue
+            self.update_item_text(page_num)
+            if page_num in self.loaded:
+                image = self.renderer.cache.get(self.thumbnail_key(page_num))
+                if image is not None:
+                    self.item(page_num).setIcon(self.make_icon(image, counts.get(page_num, 0)))
+                else:
+                    # Uscita dalla cache in memoria: verrà ricaricata dal disco
+                    self.loaded.discard(page_num)
+                    self.request(page_num, VISIBLE_PRIORITY)
+
+    def set_current_page(self, page_num):
+        """Seleziona la miniatura della pagina corrente senza emettere page_selected"""
+        if 0 <= page_num < self.count():
+            self.setCurrentRow(page_num)
+            self.scrollToItem(self.item(page_num))
@@ -1,6 +1,6 @@
-from PyQt6.QtCore import pyqtSignal
-from PyQt6.QtGui import QTextCursor, QTextCharFormat, QColor, QMouseEvent
-from PyQt6.QtWidgets import QTextEdit
+from PyQt6.QtCore import pyqtSignal, Qt, QObject, QAbstractListModel, QModelIndex, QRect, QSize
+from PyQt6.QtGui import QColor, QMouseEvent, QPalette
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QAbstractItemView
 
 
 txt_colors = [
@@ -11,160 +11,273 @@ txt_colors = [
     '#E6B3FF'   # Viola chiaro - distintivo ma delicato
 ]
 
-class CustomTextEdit(QTextEdit):
+
+class TextLineModel(QAbstractListModel):
+    """
+    Modello delle righe di testo. Le righe sono una semplice lista di stringhe;
+    le evidenziazioni (riga e intervalli di caratteri) sono tenute a parte, così
+    cambiarle notifica solo le righe coinvolte.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._lines = []
+        self.max_length = 0  # lunghezza della riga più lunga (per la larghezza della vista)
+        self.highlighted_row = -1
+        self.char_highlights = {}  # riga -> [(posizione, numero caratteri, colore)]
+        # callable(riga) -> [(posizione, numero caratteri, colore)], chiamata solo
+        # per le righe disegnate (es. le differenze di tutte le righe)
+        self.span_provider = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._lines)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._lines[index.row()]
+        return None
+
+    def line(self, row):
+        return self._lines[row]
+
+    @staticmethod
+    def split_lines(lines):
+        """Come QTextEdit.append: il testo con a capo occupa più righe"""
+        result = []
+        for line in lines:
+            if '\n' in line:
+                result.extend(line.split('\n'))
+            else:
+                result.append(line)
+        return result
+
+    def row_spans(self, row):
+        """Intervalli di caratteri da colorare nella riga: permanenti, poi evidenziati"""
+        spans = list(self.span_provider(row)) if self.span_provider is not None else []
+        spans.extend(self.char_highlights.get(row, []))
+        return spans
+
+    def set_lines(self, lines):
+        """Sostituisce tutte le righe in un'unica operazione"""
+        self.beginResetModel()
+        self._lines = self.split_lines(lines)
+        self.max_length = max(map(len, self._lines), default=0)
+        self.highlighted_row = -1
+        self.char_highlights = {}
+        self.endResetModel()
+
+    def append_lines(self, lines):
+        lines = self.split_lines(lines)
+        if not lines:
+            return
+        start = len(self._lines)
+        self.beginInsertRows(QModelIndex(), start, start + len(lines) - 1)
+        self._lines.extend(lines)
+        self.max_length = max(self.max_length, max(map(len, lines)))
+        self.endInsertRows()
+
+    def row_changed(self, row):
+        if 0 <= row < len(self._lines):
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def set_highlighted_row(self, row):
+        old = self.highlighted_row
+        self.highlighted_row = row
+        self.row_changed(old)
+        self.row_changed(row)
+
+    def add_char_highlight(self, row, position, count, color):
+        self.char_highlights.setdefault(row, []).append((position, count, color))
+        self.row_changed(row)
+
+    def clear_highlights(self):
+        """Rimuove le evidenziazioni notificando solo le righe che ne avevano"""
+        rows = set(self.char_highlights)
+        rows.add(self.highlighted_row)
+        self.highlighted_row = -1
+        self.char_highlights = {}
+        for row in rows:
+            self.row_changed(row)
+
+
+class TextLineDelegate(QStyledItemDelegate):
+    """Disegna una riga con l'eventuale sfondo di riga e degli intervalli di caratteri"""
+
+    LINE_COLOR = QColor("#d9eaff")  # Un colore azzurro chiaro
+    MARGIN = 4
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        row = index.row()
+        text = model.line(row)
+        rect = option.rect
+        metrics = option.fontMetrics
+
+        painter.save()
+        if row == model.highlighted_row:
+            painter.fillRect(rect, self.LINE_COLOR)
+
+        x = rect.x() + self.MARGIN
+        for position, count, color in model.row_spans(row):
+            start = x + metrics.horizontalAdvance(text[:position])
+            width = metrics.horizontalAdvance(text[position:position + count])
+            painter.fillRect(QRect(start, rect.y(), width, rect.height()), QColor(color))
+
+        painter.setFont(option.font)
+        painter.setPen(option.palette.color(QPalette.ColorRole.Text))
+        painter.drawText(rect.adjusted(self.MARGIN, 0, 0, 0),
+                         Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, text)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        # Tutte le righe hanno la stessa dimensione: larga quanto la riga più lunga
+        metrics = option.fontMetrics
+        width = metrics.horizontalAdvance('M') * index.model().max_length + 2 * self.MARGIN
+        return QSize(width, metrics.height())
+
+
+class TextLineView(QListView):
+    """
+    Vista delle righe di testo che dispone e disegna solo le righe visibili.
+    Le righe sono indici del modello: raggiungerne una costa O(1) e non
+    richiede di scorrere un documento di testo.
+    """
     lineClicked = pyqtSignal(int)
+
     def __init__(self, parent=None):
         super().__init__(parent)
-       # self.setPlainText("Riga 1\nRiga 2\nRiga 3\nRiga 4\nRiga 5")
+        self.line_model = TextLineModel(self)
+        self.setModel(self.line_model)
+        self.setItemDelegate(TextLineDelegate(self))
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        # Scroll per riga: il valore della scrollbar è la riga in cima alla vista
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerItem)
+
+    def top_row(self):
+        return self.verticalScrollBar().value()
+
+    def scroll_to_top_row(self, row):
+        self.verticalScrollBar().setValue(row)
 
     def mousePressEvent(self, event: QMouseEvent):
-        # Chiama il metodo originale per mantenere il comportamento predefinito
         super().mousePressEvent(event)
 
         # Pulisce l'evidenziazione precedente se esiste
         self.clear_highlight()
 
-        # Ottiene il cursore del testo nella posizione del clic
-        cursor = self.cursorForPosition(event.pos())
+        count = self.line_model.rowCount()
+        if not count:
+            return
+        # Un clic sotto l'ultima riga corrisponde all'ultima riga, come in QTextEdit
+        row = self.indexAt(event.pos()).row()
+        self.lineClicked.emit(row if row >= 0 else count - 1)
 
-        # Ottiene il numero del blocco (che corrisponde al numero della riga)
-        line_number = cursor.blockNumber()
+    def set_lines(self, lines):
+        """Sostituisce il contenuto con le righe indicate"""
+        self.line_model.set_lines(lines)
 
-        # Evidenzia la nuova riga
-        #self.highlight_line(cursor)
-        self.lineClicked.emit(line_number)
+    def append(self, text):
+        self.line_model.append_lines([text])
+
+    def append_lines(self, lines):
+        """Aggiunge più righe con un solo inserimento nel modello"""
+        self.line_model.append_lines(lines)
+
+    def clear(self):
+        self.line_model.set_lines([])
+
+    def set_span_provider(self, provider):
+        """Imposta (o rimuove con None) gli intervalli colorati calcolati per riga visibile"""
+        self.line_model.span_provider = provider
+        self.viewport().update()
+
+    def setReadOnly(self, read_only):
+        # La vista è sempre in sola lettura: compatibilità con QTextEdit
+        pass
 
     def highlight_and_scroll_to_line(self, line_number: int):
-        self.clear_highlight()
         """
-        Scorre la QTextEdit fino alla riga specificata e la evidenzia.
+        Scorre fino alla riga specificata e la evidenzia: la riga è un indice
+        del modello, scrollTo la rende visibile senza scorrere le precedenti.
 
         Args:
             line_number (int): Il numero della riga da visualizzare (base 1).
         """
-        # 1. Pulire qualsiasi evidenziazione precedente
-        # Se hai una funzione per pulire l'evidenziazione, è meglio chiamarla qui.
-        # Ad esempio: self.clear_highlight()
-
-        # 2. Spostare il cursore alla riga desiderata
-        cursor = self.textCursor()
-
-        # Il numero del blocco è a base 0, quindi sottraiamo 1
-        target_block_number = line_number - 1
-
-        # Sposta il cursore al blocco (riga) specificato
-        cursor.movePosition(QTextCursor.MoveOperation.Start)
-        cursor.movePosition(QTextCursor.MoveOperation.NextBlock,
-                            QTextCursor.MoveMode.MoveAnchor,
-                            target_block_number)
-
-        # 3. Rendere il cursore visibile (scorrere la vista)
-        self.setTextCursor(cursor)
-        self.ensureCursorVisible()
-
-        # 4. Evidenziare la riga corrente
-        # Crea un formato per lo sfondo
-        format = QTextCharFormat()
-        format.setBackground(QColor("#d9eaff"))  # Un colore azzurro chiaro
-
-        # Seleziona l'intera riga
-        cursor.select(QTextCursor.SelectionType.BlockUnderCursor)
-
-        # Applica il formato
-        cursor.setCharFormat(format)
+        self.clear_highlight()
+        row = line_number - 1
+        if not 0 <= row < self.line_model.rowCount():
+            return
+        self.line_model.set_highlighted_row(row)
+        self.scrollTo(self.line_model.index(row))
 
     def clear_highlight(self):
-        # Resetta il formato di tutte le righe
-        cursor = self.textCursor()
-        cursor.select(QTextCursor.SelectionType.Document)
-        format = QTextCharFormat()
-        format.setBackground(QColor("transparent"))
-        cursor.mergeCharFormat(format)
-
-    def highlight_line(self, cursor: QTextCursor):
-        # Salva la posizione attuale per poterla ripulire successivamente
-        self.current_highlight_cursor = QTextCursor(cursor)
-
-        # Prepara il formato per l'evidenziazione
-        format = QTextCharFormat()
-        format.setBackground(QColor("#d9eaff"))  # Un colore azzurro chiaro
-
-        # Seleziona l'intera riga e applica il formato
-        cursor.select(QTextCursor.SelectionType.BlockUnderCursor)
-        cursor.setCharFormat(format)
-
+        self.line_model.clear_highlights()
 
     def highlight_character_at(self, line_number: int, position: int, count=1, icol=0):
         """
-        Evidenzia caratteri in un QTextEdit.
+        Evidenzia caratteri in una riga.
 
         Args:
-            line_number (int): Il numero della riga (base 1).
+            line_number (int): Il numero della riga (base 0, come lineClicked).
             position (int): La posizione del carattere nella riga (base 0).
             count (int): Numero di caratteri da evidenziare.
-            color (str): Colore di evidenziazione.
+            icol (int): Indice del colore in txt_colors.
 
         Returns:
             bool: True se l'evidenziazione è avvenuta con successo, False altrimenti.
         """
-
+        if not 0 <= line_number < self.line_model.rowCount():
+            return False
+        if position < 0 or count < 1:
+            return False
+
+        block_length = len(self.line_model.line(line_number))
+        if position >= block_length:
+            return False
+        actual_count = min(count, block_length - position)
+
+        self.line_model.add_char_highlight(line_number, position, actual_count,
+                                           txt_colors[icol % len(txt_colors)])
+        self.scrollTo(self.line_model.index(line_number))
+        return True
+
+
+class ScrollSync(QObject):
+    """
+    Sincronizza lo scroll verticale di due TextLineView tramite una mappatura
+    delle righe: la riga in cima a un pannello porta in cima all'altro la riga
+    corrispondente, anche se i pannelli hanno righe in numero diverso.
+    """
+
+    def __init__(self, view1, view2, parent=None):
+        super().__init__(parent)
+        self.views = (view1, view2)
+        self.mappings = (None, None)  # callable(riga) -> riga dell'altro pannello (None = identità)
+        self.enabled = True
+        self._syncing = False  # evita che lo scroll indotto torni indietro
+        view1.verticalScrollBar().valueChanged.connect(lambda value: self.on_scroll(0))
+        view2.verticalScrollBar().valueChanged.connect(lambda value: self.on_scroll(1))
+
+    def set_mappings(self, map_1_to_2=None, map_2_to_1=None):
+        self.mappings = (map_1_to_2, map_2_to_1)
+
+    def on_scroll(self, side):
+        if self._syncing or not self.enabled:
+            return
+        row = self.views[side].top_row()
+        mapping = self.mappings[side]
+        if mapping is not None:
+            row = mapping(row)
+        if row < 0:
+            return
+
+        self._syncing = True
         try:
-            # Validazione input
-            if line_number < 1:
-                return False
-            if position < 0 or count < 1:
-                return False
-
-            # Crea un nuovo cursore per la formattazione
-            cursor = QTextCursor(self.document())
-
-            # Sposta alla riga desiderata
-            cursor.movePosition(QTextCursor.MoveOperation.Start)
-
-            # Verifica che la riga esista
-            total_blocks = self.document().blockCount()
-            if line_number > total_blocks:
-                return False
-
-            cursor.movePosition(QTextCursor.MoveOperation.NextBlock,
-                                QTextCursor.MoveMode.MoveAnchor,
-                                line_number)
-
-            # Verifica che la posizione sia valida nella riga
-            current_block = cursor.block()
-            block_length = len(current_block.text())
-            if position >= block_length:
-                return False
-
-            # Calcola il numero effettivo di caratteri da evidenziare
-            # (non oltre la fine della riga)
-            actual_count = min(count, block_length - position)
-            if actual_count <= 0:
-                return False
-
-            # Sposta alla posizione e seleziona
-            cursor.movePosition(QTextCursor.MoveOperation.Right,
-                                QTextCursor.MoveMode.MoveAnchor,
-                                position)
-
-            cursor.movePosition(QTextCursor.MoveOperation.Right,
-                                QTextCursor.MoveMode.KeepAnchor,
-                                actual_count)
-
-            # Applica la formattazione
-            format = QTextCharFormat()
-            color = txt_colors[icol]
-            format.setBackground(QColor(color))
-            cursor.setCharFormat(format)
-
-            # Posiziona il cursore principale senza selezione
-            main_cursor = self.textCursor()
-            main_cursor.setPosition(cursor.selectionEnd())
-            self.setTextCursor(main_cursor)
-            self.ensureCursorVisible()
-
-            return True
-
-        except Exception as e:
-            print(f"Errore nell'evidenziazione: {e}")
-            return False
\ No newline at end of file
+            self.views[1 - side].scroll_to_top_row(row)
+        finally:
+            self._syncing = False